@@ -1,9 +1,16 @@
 import os
 
 from pipelines.training_pipeline import ml_pipeline
-from zenml import pipeline
+from zenml import pipeline, Model
+from steps.data_ingestion_step import data_ingestion_step
+from steps.data_splitter_step import data_splitter_step
 from steps.dynamic_importer import dynamic_importer
+from steps.feature_engineering_step import feature_engineering_step
+from steps.handle_missing_values_step import handle_missing_values_step
+from steps.incremental_training_step import incremental_training_step
+from steps.model_evaluator_step import model_evaluator_step
 from steps.model_loader import model_loader
+from steps.outlier_detection_step import outlier_detection_step
 from steps.prediction_service_loader import prediction_service_loader
 from steps.predictor import predictor
 from zenml.integrations.mlflow.steps import mlflow_model_deployer_step
@@ -19,6 +26,31 @@ def continous_deployment_pipeline():
     #Deploy the trained model
     mlflow_model_deployer_step(workers = 3, deploy_decision= True, model= trained_model)
     
+@pipeline(
+    model= Model(name= "prices_predictor")
+)
+def incremental_deployment_pipeline(file_path: str, fill_values_path: str = "extracted_data/fill_values.json"):
+    '''Updates the production model with the new rows of file_path only and deploys it,
+    the production model must have been trained with model_strategy="streaming"
+    '''
+    new_data = data_ingestion_step(file_path= file_path)
+    
+    #Fill with the training fill values rather than statistics of the new rows
+    filled_data = handle_missing_values_step(df= new_data, fill_values_path= fill_values_path, reuse_fill_values= True)
+    transformed_data = feature_engineering_step(data= filled_data, strategy= "log", features= ["Gr Liv Area","SalePrice"])
+    
+    #Remove outliers as in training, so only rows the production model could have seen are merged in
+    cleaned_data = outlier_detection_step(df= transformed_data, column_name= "SalePrice")
+    
+    #Hold out part of the new rows to evaluate the updated model
+    X_new, X_test, y_new, y_test = data_splitter_step(df= cleaned_data, target_column= "SalePrice")
+    
+    production_model = model_loader(model_name= "prices_predictor")
+    updated_model = incremental_training_step(production_model= production_model, X_new= X_new, y_new= y_new)
+    model_evaluator_step(trained_model= updated_model, X_test= X_test, y_test= y_test)
+    
+    mlflow_model_deployer_step(workers = 3, deploy_decision= True, model= updated_model)
+
 
 @pipeline
 def inference_pipeline():
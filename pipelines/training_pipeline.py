@@ -5,20 +5,27 @@ from steps.model_building_step import model_building_step
 from steps.model_evaluator_step import model_evaluator_step
 from steps.data_splitter_step import data_splitter_step
 from steps.outlier_detection_step import outlier_detection_step
+from steps.chunked_training_step import chunked_training_step
+from steps.cross_validation_step import cross_validation_step
+from steps.model_compilation_step import model_compilation_step
 from zenml import pipeline, Model, step
 
 @pipeline(
     model= Model(name= "prices_predictor")
 )
 
-def ml_pipeline():
-    """Defines end-to-end ML pipeline."""
+def ml_pipeline(model_strategy: str = "linear", fill_values_path: str = "extracted_data/fill_values.json"):
+    """Defines end-to-end ML pipeline.
+
+    model_strategy="streaming" trains a model that incremental_deployment_pipeline can later update with new rows only.
+    Linear models are also compiled into a NumPy-only scoring artifact next to the sklearn pipeline.
+    """
     
     #Data ingestion
     raw_data = data_ingestion_step(file_path= "/data/archive.zip")
     
     #Handle missing values
-    filled_data = handle_missing_values_step(df= raw_data)
+    filled_data = handle_missing_values_step(df= raw_data, fill_values_path= fill_values_path)
     
     #Feature engineering
     transformed_data = feature_engineering_step(data= filled_data, strategy= "log", features= ["Gr Liv Area","SalePrice"])
@@ -29,12 +36,30 @@ def ml_pipeline():
     #Data splitting
     X_train, X_test, y_train, y_test = data_splitter_step(df= cleaned_data, target_column= "SalePrice")
     
+    #Cross-validation on the training data
+    cross_validation_step(X_train= X_train, y_train= y_train)
+    
     #Model Building Step
-    model = model_building_step(X_train, y_train)
+    model = model_building_step(X_train, y_train, model_strategy= model_strategy)
     
     #Model Evaluation Step
     evaluation_metrics, mse = model_evaluator_step(trained_model= model, X_test=X_test, y_test=y_test)
     
+    #Model Compilation Step
+    if model_strategy in ["linear", "streaming", "search"]:
+        model_compilation_step(trained_model= model, X_test= X_test)
+    
+    return model
+
+@pipeline(
+    model= Model(name= "prices_predictor")
+)
+
+def chunked_ml_pipeline(chunksize: int = 100_000):
+    """Defines the out-of-core ML pipeline that streams the data in fixed-size chunks."""
+    
+    model, evaluation_metrics = chunked_training_step(file_path= "/data/archive.zip", target_column= "SalePrice", chunksize= chunksize)
+    
     return model
 
 if __name__ == 'main':
@@ -0,0 +1,111 @@
+import logging
+from typing import Callable, Iterator, List
+
+import numpy as np
+import pandas as pd
+from src.streaming_statistics import weighted_quantile
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Helpers for statistics accumulated over chunks
+
+def merge_counts(counts: pd.Series, new_counts: pd.Series) -> pd.Series:
+    '''Merges two value count Series, treating missing values as zero'''
+    if counts is None:
+        return new_counts
+    return counts.add(new_counts, fill_value=0)
+
+def quantile_from_counts(counts: pd.Series, q):
+    '''Computes the q-th quantile (or an array of them) from merged value counts, interpolating like pandas'''
+    counts = counts[counts > 0]
+    return weighted_quantile(counts.index.to_numpy(dtype=float), counts.to_numpy(), q)
+
+def infer_chunk_dtypes(chunks) -> dict:
+    '''Infers one dtype per column that is consistent across all chunks
+
+    A column stays numeric only if it is numeric (or entirely missing) in every chunk,
+    otherwise it is read as object so chunks never disagree on the column type.
+    '''
+    dtypes = {}
+    for chunk in chunks:
+        all_missing = chunk.isna().all()
+        for col in chunk.columns:
+            dtype = chunk[col].dtype
+            numeric = pd.api.types.is_numeric_dtype(dtype) or all_missing[col]
+            if not numeric or dtypes.get(col, np.float64) == object:
+                dtypes[col] = object
+            elif col in dtypes:
+                dtypes[col] = np.result_type(dtypes[col], dtype)
+            else:
+                dtypes[col] = dtype
+    return dtypes
+
+# Runner for the chunked (out-of-core) pipeline mode
+
+class ChunkedPipeline:
+    def __init__(self, chunk_source: Callable[[], Iterator[pd.DataFrame]], stages: List, target: str, splitter=None, numeric_only: bool = True):
+        '''Initializes the ChunkedPipeline
+
+        chunk_source is called once per pass and must return a fresh iterator of DataFrame chunks,
+        e.g. ZipStreamDataIngestion(chunksize=...).ingest_chunks bound to a file path.
+        Every stage exposes transform(chunk) and, if it keeps state, partial_fit(chunk).
+        '''
+        self.chunk_source = chunk_source
+        self.stages = stages
+        self.target = target
+        self.splitter = splitter
+        self.numeric_only = numeric_only
+        self.dtypes = None
+    
+    def iter_chunks(self, n_stages: int = None) -> Iterator[pd.DataFrame]:
+        '''Yields chunks cast to the inferred dtypes and transformed by the first n_stages stages'''
+        stages = self.stages if n_stages is None else self.stages[:n_stages]
+        for chunk in self.chunk_source():
+            if self.dtypes is not None:
+                chunk = chunk.astype(self.dtypes)
+            for stage in stages:
+                chunk = stage.transform(chunk)
+            if len(chunk) > 0:
+                yield chunk
+    
+    def fit(self):
+        '''Fits every stateful stage with one streaming pass over the output of the stages before it'''
+        self.dtypes = infer_chunk_dtypes(self.chunk_source())
+        for i, stage in enumerate(self.stages):
+            if not hasattr(stage, "partial_fit"):
+                continue
+            logging.info(f"Fitting stage {type(stage).__name__} on a streaming pass")
+            for chunk in self.iter_chunks(i):
+                stage.partial_fit(chunk)
+        logging.info("Chunked pipeline stages fitted")
+        return self
+    
+    def iter_split(self):
+        '''Yields (X_train, X_test, y_train, y_test) for every transformed chunk'''
+        if self.splitter is None:
+            raise ValueError("No splitter given to the chunked pipeline")
+        for X_train, X_test, y_train, y_test in self.splitter.execute_split_chunks(self.iter_chunks(), self.target):
+            if self.numeric_only:
+                X_train = X_train.select_dtypes(include=["number"])
+                X_test = X_test.select_dtypes(include=["number"])
+            yield X_train, X_test, y_train, y_test
+    
+    def iter_train(self):
+        '''Yields the (X, y) training part of every chunk'''
+        for X_train, _, y_train, _ in self.iter_split():
+            if len(X_train) > 0:
+                yield X_train, y_train
+    
+    def iter_test(self):
+        '''Yields the (X, y) testing part of every chunk'''
+        for _, X_test, _, y_test in self.iter_split():
+            if len(X_test) > 0:
+                yield X_test, y_test
+    
+    def train(self, model_builder):
+        '''Trains the model of a ModelBuilder on the training chunks'''
+        return model_builder.execute_build_and_train_on_chunks(self.iter_train)
+    
+    def evaluate(self, model, evaluator) -> dict:
+        '''Evaluates the model of a ModelEvaluator on the testing chunks'''
+        return evaluator.execute_evaluation_on_chunks(model, self.iter_test())
@@ -0,0 +1,75 @@
+import os
+import logging
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from scipy import sparse as sp
+from src.data_splitter import DataSplitter
+from src.model_building import ModelBuilder, ModelBuildingStrategy, share_matrix, open_matrix
+from src.model_evaluation import ModelEvaluator, ModelEvaluationStrategy, RegressionModelEvaluation
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# K-fold cross-validation with folds fitted in worker processes over a memory-mapped design matrix
+
+def fold_frame(matrix, rows: np.ndarray, columns: list) -> pd.DataFrame:
+    '''Slices the rows of a fold out of the shared matrix, sparse matrices give sparse columns'''
+    if sp.issparse(matrix):
+        return pd.DataFrame.sparse.from_spmatrix(matrix[rows], columns=columns)
+    return pd.DataFrame(matrix[rows], columns=columns)
+
+def run_fold(fold: int, handle: dict, target_path: str, columns: list, train_index: np.ndarray, test_index: np.ndarray,
+             model_strategy: ModelBuildingStrategy, evaluation_strategy: ModelEvaluationStrategy) -> dict:
+    '''Trains and evaluates one fold, run by the pool workers'''
+    matrix = open_matrix(handle)
+    y = np.load(target_path, mmap_mode="r")
+    model = ModelBuilder(model_strategy).execute_build_and_train(fold_frame(matrix, train_index, columns), pd.Series(y[train_index]))
+    metrics = ModelEvaluator(evaluation_strategy).execute_evaluation(model, fold_frame(matrix, test_index, columns), pd.Series(y[test_index]))
+    return {"fold": fold, **metrics}
+
+class CrossValidationRunner:
+    def __init__(self, splitter: DataSplitter, builder: ModelBuilder, evaluator: ModelEvaluator = None, n_jobs: int = None):
+        '''Runs every split of the splitter with the builder's strategy, n_jobs worker processes fit folds in parallel'''
+        self.splitter = splitter
+        self.builder = builder
+        self.evaluator = evaluator if evaluator is not None else ModelEvaluator(RegressionModelEvaluation())
+        self.n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+    
+    def run(self, X, y, columns: list = None, split_data: pd.DataFrame = None) -> tuple:
+        '''Cross-validates on the preprocessed matrix X and returns the per-fold metrics and their mean and std
+
+        split_data is what the splitter sees, e.g. the raw frame holding Yr Sold and Mo Sold for a time-ordered split.
+        '''
+        if isinstance(X, pd.DataFrame):
+            columns = list(X.columns) if columns is None else columns
+            X = X.to_numpy(dtype=np.float64)
+        if columns is None:
+            columns = [f"x{i}" for i in range(X.shape[1])]
+        if split_data is None:
+            split_data = pd.DataFrame(index=pd.RangeIndex(X.shape[0]))
+        folds = list(self.splitter.execute_split_indices(split_data))
+        logging.info(f"Cross-validating {len(folds)} folds on {self.n_jobs or 1} workers")
+        
+        with tempfile.TemporaryDirectory(prefix="cv_") as directory:
+            # The matrix is written once, workers only receive its paths and their fold indices
+            handle = share_matrix(X, directory)
+            target_path = os.path.join(directory, "target.npy")
+            np.save(target_path, np.asarray(y, dtype=np.float64))
+            tasks = [
+                (fold, handle, target_path, columns, train_index, test_index, self.builder.strategy, self.evaluator.strategy)
+                for fold, (train_index, test_index) in enumerate(folds)
+            ]
+            if self.n_jobs is None or self.n_jobs <= 1:
+                results = [run_fold(*task) for task in tasks]
+            else:
+                with ProcessPoolExecutor(max_workers=self.n_jobs) as executor:
+                    results = list(executor.map(run_fold, *zip(*tasks)))
+        
+        fold_metrics = pd.DataFrame(results).set_index("fold")
+        summary = {}
+        for metric in fold_metrics.columns:
+            summary[f"{metric}_mean"] = float(fold_metrics[metric].mean())
+            summary[f"{metric}_std"] = float(fold_metrics[metric].std())
+        logging.info(f"Cross-validation completed with {summary}")
+        return fold_metrics, summary
@@ -1,16 +1,35 @@
 import logging
 from abc import ABC, abstractmethod
+import numpy as np
 import pandas as pd
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import ShuffleSplit, KFold, RepeatedKFold, TimeSeriesSplit
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
+def take_split(data: pd.DataFrame, target: str, train_index: np.ndarray, test_index: np.ndarray):
+    '''Materializes the features and target of positional train and test rows, copying each slice once'''
+    feature_positions = [i for i, col in enumerate(data.columns) if col != target]
+    target_position = data.columns.get_loc(target)
+    return (
+        data.iloc[train_index, feature_positions],
+        data.iloc[test_index, feature_positions],
+        data.iloc[train_index, target_position],
+        data.iloc[test_index, target_position],
+    )
+
 #Abstract Base Class for Data Splitting
 class DataSplittingStrategy(ABC):
     @abstractmethod
-    def split(self, data: pd.DataFrame, target: str, test_size: float = 0.2):
-        '''Splits the data into training and testing sets'''
+    def split_indices(self, data: pd.DataFrame):
+        '''Yields (train, test) arrays of row positions, nothing is copied'''
         pass
+    
+    def split(self, data: pd.DataFrame, target: str):
+        '''Splits the data into training and testing sets, taking the first split of split_indices'''
+        logging.info("Starting data splitting")
+        train_index, test_index = next(iter(self.split_indices(data)))
+        logging.info("Data splitting completed")
+        return take_split(data, target, train_index, test_index)
 
 #Concrete class for Data Splitting
 class SimpleTrainingSplit(DataSplittingStrategy):
@@ -19,14 +38,68 @@ class SimpleTrainingSplit(DataSplittingStrategy):
         self.test_size = test_size
         self.random_state = random_state
     
-    def split(self, data: pd.DataFrame, target: str):
-        '''Splits the data into training and testing sets'''
-        logging.info("Starting data splitting")
-        X = data.drop(columns=[target])
-        y = data[target]
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=self.test_size, random_state=42)
-        logging.info("Data splitting completed")
-        return X_train, X_test, y_train, y_test
+    def split_indices(self, data: pd.DataFrame):
+        '''Yields the shuffled train and test positions, the same rows train_test_split would pick'''
+        splitter = ShuffleSplit(n_splits=1, test_size=self.test_size, random_state=self.random_state)
+        yield from splitter.split(np.empty((len(data), 0)))
+    
+    def split_chunks(self, chunks, target: str):
+        '''Splits every chunk into training and testing rows with a reproducible random mask'''
+        rng = np.random.RandomState(self.random_state)
+        for chunk in chunks:
+            test_mask = rng.random_sample(len(chunk)) < self.test_size
+            X = chunk.drop(columns=[target])
+            y = chunk[target]
+            yield X[~test_mask], X[test_mask], y[~test_mask], y[test_mask]
+
+#Concrete class for K-Fold splitting
+class KFoldSplit(DataSplittingStrategy):
+    def __init__(self, n_splits=5, shuffle=True, random_state=42):
+        
+        self.n_splits = n_splits
+        self.shuffle = shuffle
+        self.random_state = random_state
+    
+    def split_indices(self, data: pd.DataFrame):
+        '''Yields the train and test positions of every fold'''
+        splitter = KFold(n_splits=self.n_splits, shuffle=self.shuffle, random_state=self.random_state if self.shuffle else None)
+        yield from splitter.split(np.empty((len(data), 0)))
+
+#Concrete class for repeated K-Fold splitting
+class RepeatedKFoldSplit(DataSplittingStrategy):
+    def __init__(self, n_splits=5, n_repeats=3, random_state=42):
+        
+        self.n_splits = n_splits
+        self.n_repeats = n_repeats
+        self.random_state = random_state
+    
+    def split_indices(self, data: pd.DataFrame):
+        '''Yields the train and test positions of every fold of every repetition, reshuffled each time'''
+        splitter = RepeatedKFold(n_splits=self.n_splits, n_repeats=self.n_repeats, random_state=self.random_state)
+        yield from splitter.split(np.empty((len(data), 0)))
+
+#Concrete class for time-ordered splitting
+class TimeOrderedSplit(DataSplittingStrategy):
+    def __init__(self, test_size=0.2, n_splits=None, time_columns=("Yr Sold", "Mo Sold")):
+        '''Orders the rows by time_columns (most significant first) and always tests on later sales than it trains on,
+        n_splits gives expanding-window folds instead of a single hold-out of the latest test_size rows'''
+        self.test_size = test_size
+        self.n_splits = n_splits
+        self.time_columns = list(time_columns)
+    
+    def time_order(self, data: pd.DataFrame) -> np.ndarray:
+        '''Returns the row positions sorted by time, ties kept in their original order'''
+        return np.lexsort([data[col].to_numpy() for col in reversed(self.time_columns)])
+    
+    def split_indices(self, data: pd.DataFrame):
+        '''Yields the train and test positions, test rows are the most recent ones'''
+        order = self.time_order(data)
+        if self.n_splits is None:
+            n_test = int(np.ceil(self.test_size * len(order)))
+            yield order[:len(order) - n_test], order[len(order) - n_test:]
+            return
+        for train, test in TimeSeriesSplit(n_splits=self.n_splits).split(order):
+            yield order[train], order[test]
 
 #Context class for Data Splitting
 class DataSplitter:
@@ -42,4 +115,21 @@ class DataSplitter:
         '''Executes the strategy to split the data'''
         logging.info("Splitting data on selected strategy")
         
-        return self.strategy.split(data, target)
\ No newline at end of file
+        return self.strategy.split(data, target)
+    
+    def execute_split_indices(self, data: pd.DataFrame):
+        '''Executes the strategy to get (train, test) row positions, downstream steps slice them lazily'''
+        logging.info("Splitting data indices on selected strategy")
+        
+        return self.strategy.split_indices(data)
+    
+    def iter_folds(self, data: pd.DataFrame, target: str):
+        '''Materializes one split at a time as X_train, X_test, y_train, y_test'''
+        for train_index, test_index in self.execute_split_indices(data):
+            yield take_split(data, target, train_index, test_index)
+    
+    def execute_split_chunks(self, chunks, target: str):
+        '''Executes the strategy to split a stream of chunks'''
+        logging.info("Splitting chunks on selected strategy")
+        
+        return self.strategy.split_chunks(chunks, target)
\ No newline at end of file
@@ -1,8 +1,17 @@
+import os
+import json
+import uuid
+import inspect
+import hashlib
 import logging
 from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
+import joblib
 import pandas as pd
 import numpy as np
+from scipy import sparse as sp
+from src.ingest_data import evict_least_recently_used
 from sklearn.preprocessing import OneHotEncoder, LabelEncoder, MinMaxScaler, StandardScaler
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -11,12 +20,69 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(
 
 class FeatureEngineeringStrategy(ABC):
     @abstractmethod
-    def transform(self, data: pd.DataFrame)-> pd.DataFrame:
+    def apply_transform(self, data: pd.DataFrame)-> pd.DataFrame:
         '''Transforms the data'''
         pass
+    
+    @abstractmethod
+    def transform_columns(self, columns: dict)-> dict:
+        '''Transforms a dict of column name to values in place with the fitted state'''
+        pass
+    
+    def fit(self, data)-> "FeatureEngineeringStrategy":
+        '''Fits the strategy on a DataFrame or a dict of columns, stateless strategies have nothing to fit'''
+        return self
+    
+    def fit_transform_columns(self, columns: dict)-> dict:
+        '''Fits on a dict of columns and transforms it, strategies whose training output differs from transform override this'''
+        self.fit(columns)
+        return self.transform_columns(columns)
+    
+    def get_params(self) -> dict:
+        '''Returns the constructor parameters, which identify the transform independently of its fitted state'''
+        names = [name for name in inspect.signature(type(self).__init__).parameters if name != "self"]
+        return {name: getattr(self, name) for name in names if hasattr(self, name)}
+    
+    def transform(self, data: pd.DataFrame)-> pd.DataFrame:
+        '''Transforms the data with the fitted state, building the output frame once'''
+        columns = self.transform_columns({col: data[col] for col in data.columns})
+        return pd.DataFrame(columns, index=data.index)
+
+#Base class for strategies that transform every feature independently
+
+class ColumnWiseStrategy(FeatureEngineeringStrategy):
+    @abstractmethod
+    def transform_feature(self, i: int, values)-> np.ndarray:
+        '''Transforms the values of the i-th feature with the fitted state'''
+        pass
+    
+    def transform_columns(self, columns: dict)-> dict:
+        '''Replaces every feature with its transformed values'''
+        for i, feature in enumerate(self.features):
+            columns[feature] = self.transform_feature(i, columns[feature])
+        return columns
+
+def transform_feature_group(strategy: ColumnWiseStrategy, group: list)-> list:
+    '''Transforms a group of (position, feature, values) with a column-wise strategy, run by pool workers'''
+    return [(feature, strategy.transform_feature(i, values)) for i, feature, values in group]
+
+def sparse_frame_to_csr(data: pd.DataFrame) -> sp.csr_matrix:
+    '''Converts a DataFrame holding sparse columns to a CSR matrix, dense columns first and sparse columns after'''
+    sparse_cols = [col for col in data.columns if isinstance(data[col].dtype, pd.SparseDtype)]
+    dense_cols = [col for col in data.columns if col not in sparse_cols]
+    blocks = []
+    if dense_cols:
+        blocks.append(sp.csr_matrix(data[dense_cols].to_numpy(dtype=np.float64)))
+    if sparse_cols:
+        blocks.append(data[sparse_cols].sparse.to_coo())
+    return sp.hstack(blocks, format="csr")
+
+def stack_features(data, features) -> np.ndarray:
+    '''Stacks the given columns of a DataFrame or a dict of columns into a 2-D float array'''
+    return np.column_stack([np.asarray(data[feature], dtype=np.float64) for feature in features])
 
 #Concrete class for log transformation
-class LogTransform(FeatureEngineeringStrategy):
+class LogTransform(ColumnWiseStrategy):
     
     def __init__(self, features):
         self.features = features
@@ -30,13 +96,18 @@ class LogTransform(FeatureEngineeringStrategy):
             df_transformed[feature] = np.log1p(df_transformed[feature]) # Using np.log1p to handle zero values
         logging.info("Log transformation completed")
         return df_transformed
+    
+    def transform_feature(self, i: int, values)-> np.ndarray:
+        '''Returns the log1p of a feature'''
+        return np.log1p(values)
 
 #Concreate class for MinMaxScaler
 
-class MinMaxScalerTransform(FeatureEngineeringStrategy):
+class MinMaxScalerTransform(ColumnWiseStrategy):
     
     def __init__(self, features, feature_range=(0, 1)):
         self.features = features
+        self.feature_range = feature_range
         self.scaler = MinMaxScaler(feature_range=feature_range)
     
     def apply_transform(self, data: pd.DataFrame)-> pd.DataFrame:
@@ -46,9 +117,23 @@ class MinMaxScalerTransform(FeatureEngineeringStrategy):
         df_transformed[self.features] = self.scaler.fit_transform(df_transformed[self.features])
         logging.info("Min-Max scaling completed")
         return df_transformed
+    
+    def fit(self, data):
+        '''Fits the feature minimum and maximum'''
+        self.scaler.fit(stack_features(data, self.features))
+        return self
+    
+    def partial_fit(self, data: pd.DataFrame):
+        '''Updates the feature minimum and maximum with a chunk'''
+        self.scaler.partial_fit(stack_features(data, self.features))
+        return self
+    
+    def transform_feature(self, i: int, values)-> np.ndarray:
+        '''Returns the fitted Min-Max scaling of a feature'''
+        return np.asarray(values, dtype=np.float64) * self.scaler.scale_[i] + self.scaler.min_[i]
 
 #Concrete class for StandardScaler
-class StandardScalerTransform(FeatureEngineeringStrategy):
+class StandardScalerTransform(ColumnWiseStrategy):
     
     def __init__(self, features):
         self.features = features
@@ -61,34 +146,355 @@ class StandardScalerTransform(FeatureEngineeringStrategy):
         df_transformed[self.features]= self.scaler.fit_transform(df_transformed[self.features])
         logging.info("Standard scaling completed")
         return df_transformed
+    
+    def fit(self, data):
+        '''Fits the feature mean and variance'''
+        self.scaler.fit(stack_features(data, self.features))
+        return self
+    
+    def partial_fit(self, data: pd.DataFrame):
+        '''Updates the feature mean and variance with a chunk'''
+        self.scaler.partial_fit(stack_features(data, self.features))
+        return self
+    
+    def transform_feature(self, i: int, values)-> np.ndarray:
+        '''Returns the fitted Standard scaling of a feature'''
+        return (np.asarray(values, dtype=np.float64) - self.scaler.mean_[i]) / self.scaler.scale_[i]
 
 #Concrete class for OneHotEncoder
 
 class OneHotEncoderTransform(FeatureEngineeringStrategy):
     
-    def __init__(self, features):
+    def __init__(self, features, sparse=False):
+        '''With sparse=True the encoded columns are kept as pandas sparse columns backed by the CSR output'''
         self.features = features
-        self.encoder = OneHotEncoder(sparse=False, drop='first')
+        self.sparse = sparse
+        self.encoder = OneHotEncoder(sparse_output=sparse, drop='first')
+        self.categories = {}
+        self.encoder_fitted = False
+    
+    def encoded_frame(self, encoded, index=None) -> pd.DataFrame:
+        '''Wraps the encoder output in a DataFrame, sparse output stays sparse'''
+        columns = self.encoder.get_feature_names_out(self.features)
+        if self.sparse:
+            return pd.DataFrame.sparse.from_spmatrix(encoded, index=index, columns=columns)
+        return pd.DataFrame(encoded, columns=columns, index=index)
     
     def apply_transform(self, data: pd.DataFrame)-> pd.DataFrame:
         '''Applies One-Hot encoding to the data'''
         logging.info(f"Applying One-Hot encoding: {self.features}")
         df_transformed = data.copy()
-        encoded_df = pd.DataFrame(
-            self.encoder.fit_transform(df_transformed[self.features]),
-            columns= self.encoder.get_feature_names_out(self.features)
-        )
+        # Fitting through fit marks the encoder fitted, so a saved strategy transforms new batches
+        self.fit(df_transformed)
+        encoded_df = self.encoded_frame(self.encoder.transform(df_transformed[self.features]), index=df_transformed.index)
         df_transformed= df_transformed.drop(columns= self.features)
         df_transformed = pd.concat([df_transformed, encoded_df], axis=1)
         logging.info("One-Hot encoding completed")
         return df_transformed
+    
+    def partial_fit(self, data: pd.DataFrame):
+        '''Collects the categories of every feature seen in a chunk'''
+        for feature in self.features:
+            self.categories.setdefault(feature, set()).update(data[feature].unique())
+        self.encoder_fitted = False
+        return self
+    
+    def fit_encoder(self):
+        '''Fits the encoder on the collected categories, sorted with missing values last'''
+        categories = []
+        for feature in self.features:
+            values = self.categories[feature]
+            present = sorted(value for value in values if not pd.isna(value))
+            if any(pd.isna(value) for value in values):
+                present.append(np.nan)
+            categories.append(present)
+        self.encoder.set_params(categories=categories)
+        self.encoder.fit(pd.DataFrame({feature: cats[:1] for feature, cats in zip(self.features, categories)}))
+        self.encoder_fitted = True
+    
+    def fit(self, data):
+        '''Fits the encoder on the categories of the features'''
+        self.encoder.fit(pd.DataFrame({feature: data[feature] for feature in self.features}))
+        self.encoder_fitted = True
+        return self
+    
+    def transform_columns(self, columns: dict)-> dict:
+        '''Replaces the features with their fitted One-Hot encoding'''
+        if not self.encoder_fitted:
+            self.fit_encoder()
+        encoded = self.encoder.transform(pd.DataFrame({feature: columns.pop(feature) for feature in self.features}))
+        if self.sparse:
+            columns.update({name: values.array for name, values in self.encoded_frame(encoded).items()})
+            return columns
+        for i, name in enumerate(self.encoder.get_feature_names_out(self.features)):
+            columns[name] = encoded[:, i]
+        return columns
+
+#Concrete class for feature hashing
+
+class HashingEncoderTransform(FeatureEngineeringStrategy):
+    
+    def __init__(self, features, n_features=2**10, alternate_sign=True, sparse=True, prefix="hash"):
+        '''Hashes feature=value pairs into n_features columns, so width and memory never grow with the number of categories'''
+        self.features = features
+        self.n_features = n_features
+        self.alternate_sign = alternate_sign
+        self.sparse = sparse
+        self.prefix = prefix
+    
+    def hash_features(self, columns) -> sp.csr_matrix:
+        '''Hashes the features of a DataFrame or a dict of columns into a CSR matrix'''
+        blocks_rows, blocks_cols, blocks_data = [], [], []
+        for feature in self.features:
+            values = pd.Series(np.asarray(columns[feature], dtype=object)).astype(str)
+            # The feature name is part of the hashed token, so equal values of different features do not collide
+            hashes = pd.util.hash_array((feature + "=" + values).to_numpy(dtype=object), categorize=True)
+            blocks_rows.append(np.arange(len(values)))
+            blocks_cols.append((hashes % np.uint64(self.n_features)).astype(np.int64))
+            if self.alternate_sign:
+                blocks_data.append(np.where(hashes >> np.uint64(63), -1.0, 1.0))
+            else:
+                blocks_data.append(np.ones(len(values)))
+        n_rows = len(blocks_rows[0]) if blocks_rows else 0
+        return sp.csr_matrix(
+            (np.concatenate(blocks_data), (np.concatenate(blocks_rows), np.concatenate(blocks_cols))),
+            shape=(n_rows, self.n_features)
+        )
+    
+    def feature_names(self) -> list:
+        '''Returns the names of the hashed output columns'''
+        return [f"{self.prefix}_{i}" for i in range(self.n_features)]
+    
+    def transform_columns(self, columns: dict)-> dict:
+        '''Replaces the features with their hashed encoding'''
+        hashed = self.hash_features(columns)
+        for feature in self.features:
+            columns.pop(feature)
+        if self.sparse:
+            hashed_df = pd.DataFrame.sparse.from_spmatrix(hashed, columns=self.feature_names())
+            columns.update({name: values.array for name, values in hashed_df.items()})
+        else:
+            dense = hashed.toarray()
+            columns.update({name: dense[:, i] for i, name in enumerate(self.feature_names())})
+        return columns
+    
+    def apply_transform(self, data: pd.DataFrame)-> pd.DataFrame:
+        '''Applies feature hashing to the data'''
+        logging.info(f"Applying feature hashing: {self.features} into {self.n_features} columns")
+        df_transformed = self.transform(data)
+        logging.info("Feature hashing completed")
+        return df_transformed
+
+#Concrete class for out-of-fold target encoding
+
+class TargetEncoderTransform(FeatureEngineeringStrategy):
+    
+    def __init__(self, features, target="SalePrice", n_splits=5, smoothing=10.0, random_state=42):
+        '''Replaces each category with its target mean shrunk towards the global mean by smoothing pseudo-counts,
+        training rows are encoded out-of-fold over n_splits folds so their own target never leaks into the feature'''
+        self.features = features
+        self.target = target
+        self.n_splits = n_splits
+        self.smoothing = smoothing
+        self.random_state = random_state
+        self.prior = None
+        self.encodings = {}
+    
+    def group_statistics(self, columns) -> tuple:
+        '''Returns fold ids, per-feature category codes and categories, and target sums and counts per (fold, category)
+        of all features, computed in a single bincount pass'''
+        y = np.asarray(columns[self.target], dtype=np.float64)
+        n_rows = len(y)
+        folds = np.random.RandomState(self.random_state).permutation(n_rows) % self.n_splits
+        valid = ~np.isnan(y)
+        
+        codes, categories, offsets = [], [], [0]
+        for feature in self.features:
+            feature_codes, uniques = pd.factorize(pd.Series(np.asarray(columns[feature], dtype=object)), use_na_sentinel=False)
+            codes.append(feature_codes)
+            categories.append(pd.Index(uniques))
+            offsets.append(offsets[-1] + len(uniques))
+        
+        # Every (fold, feature, category) triple gets one bin, so one pass covers all features and folds
+        n_bins = offsets[-1]
+        keys = np.concatenate([(folds * n_bins + offsets[i] + feature_codes)[valid] for i, feature_codes in enumerate(codes)])
+        weights = np.tile(y[valid], len(self.features))
+        sums = np.bincount(keys, weights=weights, minlength=self.n_splits * n_bins).reshape(self.n_splits, n_bins)
+        counts = np.bincount(keys, minlength=self.n_splits * n_bins).reshape(self.n_splits, n_bins)
+        
+        fold_sums = np.bincount(folds[valid], weights=y[valid], minlength=self.n_splits)
+        fold_counts = np.bincount(folds[valid], minlength=self.n_splits)
+        return folds, codes, categories, offsets, sums, counts, fold_sums, fold_counts
+    
+    def smoothed_means(self, sums, counts, prior) -> np.ndarray:
+        '''Returns the category means shrunk towards the prior'''
+        return (sums + self.smoothing * prior) / (counts + self.smoothing)
+    
+    def fit_statistics(self, statistics: tuple):
+        '''Builds the lookup tables (category -> encoding) from the full-data statistics'''
+        _, _, categories, offsets, sums, counts, fold_sums, fold_counts = statistics
+        self.prior = fold_sums.sum() / max(fold_counts.sum(), 1)
+        means = self.smoothed_means(sums.sum(axis=0), counts.sum(axis=0), self.prior)
+        self.encodings = {
+            feature: pd.Series(means[offsets[i]:offsets[i + 1]], index=categories[i])
+            for i, feature in enumerate(self.features)
+        }
+    
+    def fit(self, data):
+        '''Fits the lookup tables on a DataFrame or a dict of columns holding the target'''
+        self.fit_statistics(self.group_statistics(data))
+        return self
+    
+    def fit_transform_columns(self, columns: dict)-> dict:
+        '''Fits the lookup tables and replaces the features with their out-of-fold encodings'''
+        statistics = self.group_statistics(columns)
+        folds, codes, _, offsets, sums, counts, fold_sums, fold_counts = statistics
+        self.fit_statistics(statistics)
+        
+        # Statistics of every fold's complement, by subtracting the fold from the totals
+        oof_sums = sums.sum(axis=0) - sums
+        oof_counts = counts.sum(axis=0) - counts
+        oof_priors = (fold_sums.sum() - fold_sums) / np.maximum(fold_counts.sum() - fold_counts, 1)
+        oof_means = self.smoothed_means(oof_sums, oof_counts, oof_priors[:, None])
+        for i, feature in enumerate(self.features):
+            columns[feature] = oof_means[folds, offsets[i] + codes[i]]
+        return columns
+    
+    def transform_columns(self, columns: dict)-> dict:
+        '''Maps the features through the lookup tables, unseen categories get the prior'''
+        for feature in self.features:
+            table = self.encodings[feature]
+            positions = table.index.get_indexer(pd.Series(np.asarray(columns[feature], dtype=object)))
+            columns[feature] = np.append(table.to_numpy(), self.prior)[positions]
+        return columns
+    
+    def apply_transform(self, data: pd.DataFrame)-> pd.DataFrame:
+        '''Applies out-of-fold target encoding to the data'''
+        logging.info(f"Applying target encoding: {self.features}")
+        columns = self.fit_transform_columns({col: data[col] for col in data.columns})
+        logging.info("Target encoding completed")
+        return pd.DataFrame(columns, index=data.index)
+
+#Composite strategy applying several fitted strategies in order
+
+class FeatureEngineeringChain(FeatureEngineeringStrategy):
+    
+    def __init__(self, strategies: list):
+        self.strategies = strategies
+    
+    def get_params(self) -> dict:
+        '''Returns the class and parameters of every strategy in the chain'''
+        return {"strategies": [{"class": type(strategy).__name__, **strategy.get_params()} for strategy in self.strategies]}
+    
+    def fit(self, data):
+        '''Fits every strategy on the output of the strategies before it'''
+        columns = {col: data[col] for col in data.columns}
+        for strategy in self.strategies:
+            columns = strategy.fit_transform_columns(columns)
+        return self
+    
+    def fit_transform_columns(self, columns: dict)-> dict:
+        '''Fits every strategy on the output of the strategies before it and returns the final columns'''
+        for strategy in self.strategies:
+            columns = strategy.fit_transform_columns(columns)
+        return columns
+    
+    def transform_columns(self, columns: dict)-> dict:
+        '''Passes the columns through every fitted strategy in order'''
+        for strategy in self.strategies:
+            columns = strategy.transform_columns(columns)
+        return columns
+    
+    def apply_transform(self, data: pd.DataFrame)-> pd.DataFrame:
+        '''Fits the chain and transforms the data in one pass, only the final output frame is allocated'''
+        logging.info(f"Applying feature engineering chain: {[type(strategy).__name__ for strategy in self.strategies]}")
+        df_transformed = pd.DataFrame(self.fit_transform_columns({col: data[col] for col in data.columns}), index=data.index)
+        logging.info("Feature engineering chain completed")
+        return df_transformed
+
+#On-disk cache of transformed frames keyed by input fingerprint and strategy parameters
+
+class FeatureEngineeringCache:
+    def __init__(self, cache_dir: str = ".feature_cache", max_cache_bytes: int = 1024**3):
+        '''Stores transformed frames and fitted strategies in cache_dir, evicting least recently used entries beyond max_cache_bytes'''
+        self.cache_dir = cache_dir
+        self.max_cache_bytes = max_cache_bytes
+        self.hits = 0
+        self.misses = 0
+    
+    def fingerprint(self, data: pd.DataFrame, strategy: FeatureEngineeringStrategy) -> str:
+        '''Hashes every column of the input together with the strategy class and parameters'''
+        digest = hashlib.sha256()
+        digest.update(pd.util.hash_pandas_object(data.index).to_numpy().tobytes())
+        for col in data.columns:
+            digest.update(f"{col}:{data[col].dtype}".encode())
+            digest.update(pd.util.hash_pandas_object(data[col], index=False).to_numpy().tobytes())
+        config = {"class": type(strategy).__name__, "params": strategy.get_params()}
+        digest.update(json.dumps(config, sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+    
+    def entry_paths(self, key: str) -> tuple:
+        '''Returns the paths of the transformed frame (parquet, or pickle for sparse frames) and the fitted strategy'''
+        base = os.path.join(self.cache_dir, key)
+        return f"{base}.parquet", f"{base}.pkl", f"{base}.joblib"
+    
+    def get(self, key: str):
+        '''Returns the cached (frame, fitted strategy) for key, or None on a miss'''
+        parquet_path, pickle_path, strategy_path = self.entry_paths(key)
+        frame_path = parquet_path if os.path.exists(parquet_path) else pickle_path
+        if not (os.path.exists(frame_path) and os.path.exists(strategy_path)):
+            self.misses += 1
+            return None
+        
+        self.hits += 1
+        for path in (frame_path, strategy_path):
+            os.utime(path)
+        if frame_path == parquet_path:
+            data = pd.read_parquet(frame_path)
+        else:
+            data = pd.read_pickle(frame_path)
+        return data, joblib.load(strategy_path)
+    
+    def put(self, key: str, data: pd.DataFrame, strategy: FeatureEngineeringStrategy):
+        '''Stores the transformed frame and the fitted strategy, then evicts old entries'''
+        os.makedirs(self.cache_dir, exist_ok=True)
+        parquet_path, pickle_path, strategy_path = self.entry_paths(key)
+        
+        # Parquet has no sparse columns, frames holding them are pickled instead
+        has_sparse = any(isinstance(dtype, pd.SparseDtype) for dtype in data.dtypes)
+        frame_path = pickle_path if has_sparse else parquet_path
+        tmp_path = f"{frame_path}.{uuid.uuid4().hex}.tmp"
+        if has_sparse:
+            data.to_pickle(tmp_path)
+        else:
+            data.to_parquet(tmp_path)
+        joblib.dump(strategy, strategy_path)
+        os.replace(tmp_path, frame_path)
+        
+        evict_least_recently_used(self.cache_dir, self.max_cache_bytes, keep=[frame_path, strategy_path], suffixes=(".parquet", ".pkl", ".joblib"))
+    
+    def stats(self) -> dict:
+        '''Returns the hit and miss counts'''
+        return {"hits": self.hits, "misses": self.misses}
 
 #Context class for Feature Engineering
 
 class FeatureEngineer:
-    def __init__(self, strategy: FeatureEngineeringStrategy):
+    def __init__(self, strategy: FeatureEngineeringStrategy, cache: FeatureEngineeringCache = None, n_jobs: int = None, backend: str = "thread", parallel_threshold: int = 1_000_000):
+        '''n_jobs > 1 (or -1 for all cores) splits the features of column-wise strategies across a thread or process pool,
+        strategies touching fewer than parallel_threshold cells stay on the serial path'''
         
+        if backend not in ["thread", "process"]:
+            raise ValueError(f"Unsupported backend: {backend}")
+        
+        # An ordered list of strategies runs as one chain
+        if isinstance(strategy, list):
+            strategy = FeatureEngineeringChain(strategy)
         self.strategy = strategy
+        self.cache = cache
+        self.n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+        self.backend = backend
+        self.parallel_threshold = parallel_threshold
         
     
     def set_strategy(self, strategy: FeatureEngineeringStrategy):
@@ -101,6 +507,88 @@ class FeatureEngineer:
         ''' Executes the strategy mentioned in the function '''
         logging.info("Applying feature engineering")
         
-        return self.strategy.apply_transform(data)
+        if self.cache is None:
+            return self.fit_transform(data)
+        
+        # A hit also restores the fitted strategy, so transform and save keep working
+        key = self.cache.fingerprint(data, self.strategy)
+        cached = self.cache.get(key)
+        if cached is not None:
+            df_transformed, self.strategy = cached
+            logging.info(f"Feature engineering cache hit: {self.cache.stats()}")
+            return df_transformed
+        
+        df_transformed = self.fit_transform(data)
+        self.cache.put(key, df_transformed, self.strategy)
+        logging.info(f"Feature engineering cache miss: {self.cache.stats()}")
+        return df_transformed
+    
+    def strategies(self) -> list:
+        '''Returns the strategies applied in order'''
+        if isinstance(self.strategy, FeatureEngineeringChain):
+            return self.strategy.strategies
+        return [self.strategy]
+    
+    def use_parallel(self, strategy: FeatureEngineeringStrategy, n_rows: int) -> bool:
+        '''Checks whether a strategy is column-wise and large enough to be worth a pool'''
+        return (
+            self.n_jobs is not None and self.n_jobs > 1
+            and isinstance(strategy, ColumnWiseStrategy)
+            and len(strategy.features) > 1
+            and n_rows * len(strategy.features) >= self.parallel_threshold
+        )
+    
+    def transform_columns_parallel(self, strategy: ColumnWiseStrategy, columns: dict) -> dict:
+        '''Transforms groups of features in the pool and puts the results back into the columns dict'''
+        tasks = [(i, feature, columns[feature]) for i, feature in enumerate(strategy.features)]
+        groups = [group.tolist() for group in np.array_split(np.arange(len(tasks)), min(self.n_jobs, len(tasks)))]
+        executor_class = ThreadPoolExecutor if self.backend == "thread" else ProcessPoolExecutor
+        with executor_class(max_workers=self.n_jobs) as executor:
+            results = executor.map(transform_feature_group, [strategy] * len(groups), [[tasks[i] for i in group] for group in groups])
+            for group_result in results:
+                for feature, values in group_result:
+                    columns[feature] = values
+        return columns
+    
+    def run_columns(self, data: pd.DataFrame, fit: bool) -> pd.DataFrame:
+        '''Passes the columns through every strategy, in parallel where it pays off, and builds the output frame once'''
+        columns = {col: data[col] for col in data.columns}
+        for strategy in self.strategies():
+            if self.use_parallel(strategy, len(data)):
+                if fit:
+                    strategy.fit(columns)
+                logging.info(f"Applying {type(strategy).__name__} on {self.n_jobs} {self.backend} workers")
+                columns = self.transform_columns_parallel(strategy, columns)
+            elif fit:
+                columns = strategy.fit_transform_columns(columns)
+            else:
+                columns = strategy.transform_columns(columns)
+        return pd.DataFrame(columns, index=data.index)
+    
+    def fit_transform(self, data: pd.DataFrame)-> pd.DataFrame:
+        '''Fits and applies the strategy, splitting column-wise strategies across the pool when n_jobs is set'''
+        if self.n_jobs is None or self.n_jobs <= 1:
+            return self.strategy.apply_transform(data)
+        return self.run_columns(data, fit=True)
+    
+    def fit(self, data: pd.DataFrame):
+        '''Fits the strategy without transforming the data'''
+        self.strategy.fit(data)
+        return self
+    
+    def transform(self, data: pd.DataFrame)-> pd.DataFrame:
+        '''Applies the fitted strategy, e.g. to inference batches'''
+        if self.n_jobs is None or self.n_jobs <= 1:
+            return self.strategy.transform(data)
+        return self.run_columns(data, fit=False)
+    
+    def save(self, path: str):
+        '''Persists the fitted strategy so inference applies exactly the same transforms'''
+        joblib.dump(self.strategy, path)
+    
+    @classmethod
+    def load(cls, path: str):
+        '''Loads a FeatureEngineer persisted with save'''
+        return cls(joblib.load(path))
         
     
\ No newline at end of file
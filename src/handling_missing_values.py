@@ -1,6 +1,13 @@
+import json
 import logging
+import warnings
+import numpy as np
 import pandas as pd
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from sklearn.neighbors import BallTree, KDTree
+from src.chunked_pipeline import merge_counts
+from src.streaming_statistics import RunningMoments, KLLSketch, FrequentItems
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
@@ -18,6 +25,8 @@ class DropMissingValuesStrategy(MissingValuesHandler):
         
         self.axis = axis
         self.thresh = thresh
+        self.non_missing_counts = None
+        self.n_rows = 0
         
     def handle(self, df: pd.DataFrame)-> pd.DataFrame:
         
@@ -27,36 +36,312 @@ class DropMissingValuesStrategy(MissingValuesHandler):
         logging.info("Missing values dropped")
         return df_cleaned
     
+    def partial_fit(self, df: pd.DataFrame):
+        '''Accumulates the non-missing counts per column used when dropping columns'''
+        self.non_missing_counts = merge_counts(self.non_missing_counts, df.notna().sum())
+        self.n_rows += len(df)
+        return self
+    
+    def transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        '''Drops missing values from a chunk, using the fitted counts when dropping columns'''
+        if self.axis not in (1, "columns"):
+            return df.dropna(axis=self.axis, thresh=self.thresh)
+        
+        thresh = self.n_rows if self.thresh is None else self.thresh
+        keep = self.non_missing_counts.index[self.non_missing_counts >= thresh]
+        return df[[col for col in df.columns if col in keep]]
+    
+def column_modes(values: np.ndarray) -> np.ndarray:
+    '''Computes the smallest most frequent value of every column of a 2-D float array, ignoring NaN'''
+    n_rows, n_cols = values.shape
+    if n_rows == 0:
+        return np.full(n_cols, np.nan)
+    sorted_values = np.sort(values, axis=0)
+    valid = ~np.isnan(sorted_values)
+    
+    # Number the runs of equal values in every column, offset per column so one bincount covers all columns
+    new_run = np.ones(sorted_values.shape, dtype=bool)
+    new_run[1:] = sorted_values[1:] != sorted_values[:-1]
+    run_ids = np.cumsum(new_run, axis=0) + np.arange(n_cols) * (n_rows + 1)
+    run_counts = np.bincount(run_ids[valid], minlength=n_cols * (n_rows + 1)).reshape(n_cols, n_rows + 1)
+    
+    best_runs = run_counts.argmax(axis=1) + np.arange(n_cols) * (n_rows + 1)
+    first_rows = (run_ids == best_runs).argmax(axis=0)
+    modes = sorted_values[first_rows, np.arange(n_cols)]
+    modes[run_counts.max(axis=1) == 0] = np.nan
+    return modes
+
+def to_builtin(value):
+    '''Converts numpy scalars to python values so fitted statistics serialize to json'''
+    if pd.isna(value):
+        return None
+    return value.item() if hasattr(value, "item") else value
+
 #Concrete class for filling Missing Values
 class FillMissingValuesStrategy(MissingValuesHandler):
-    def __init__(self, method= "mean", fill_value=None):
+    def __init__(self, method= "mean", fill_value=None, categorical_method=None, sketch_size=200, max_counters=1000):
+        '''Fills numeric columns with their mean, median, mode or a constant, and categorical columns with their mode if categorical_method is "mode"
+
+        sketch_size and max_counters bound the memory of the streaming median and mode statistics used by partial_fit.
+        '''
+        if categorical_method not in [None, "mode"]:
+            raise ValueError(f"Unsupported categorical method: {categorical_method}")
         
         self.method = method
         self.fill_value = fill_value
+        self.categorical_method = categorical_method
+        self.sketch_size = sketch_size
+        self.max_counters = max_counters
+        self.moments = RunningMoments()
+        self.sketches = {}
+        self.frequent_items = {}
+        self.fill_values = None
+    
+    def fit(self, df: pd.DataFrame):
+        '''Computes the fill value of every column in one vectorized pass per dtype group'''
+        logging.info(f"Fitting fill values with {self.method}")
+        
+        if self.method == "constant":
+            self.fill_values = pd.Series(dtype=object)
+            return self
+        
+        numeric_cols = df.select_dtypes(include=["number"]).columns
+        values = df[numeric_cols].to_numpy(dtype=np.float64)
+        
+        with np.errstate(invalid="ignore", divide="ignore"):
+            if self.method == "mean":
+                statistics = np.nansum(values, axis=0) / (~np.isnan(values)).sum(axis=0)
+            elif self.method == "median":
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore", RuntimeWarning)
+                    statistics = np.nanmedian(values, axis=0) if len(values) else np.full(len(numeric_cols), np.nan)
+            elif self.method == "mode":
+                statistics = column_modes(values)
+            else:
+                raise ValueError(f"Unsupported method: {self.method}")
+        fill_values = pd.Series(statistics, index=numeric_cols, dtype=object)
+        
+        if self.categorical_method == "mode":
+            categorical_cols = df.select_dtypes(exclude=["number"]).columns
+            # Factorize every column to integer codes so the modes share the numeric code path
+            codes, uniques = [], []
+            for col in categorical_cols:
+                col_codes, col_uniques = pd.factorize(df[col])
+                codes.append(np.where(col_codes < 0, np.nan, col_codes))
+                uniques.append(col_uniques)
+            if len(codes):
+                mode_codes = column_modes(np.column_stack(codes))
+                categorical_modes = pd.Series(
+                    [np.nan if np.isnan(code) else col_uniques[int(code)] for code, col_uniques in zip(mode_codes, uniques)],
+                    index=categorical_cols, dtype=object
+                )
+                fill_values = pd.concat([fill_values, categorical_modes])
+        
+        self.fill_values = fill_values.dropna()
+        logging.info("Fill values fitted")
+        return self
+    
+    def transform(self, df: pd.DataFrame, inplace: bool = False) -> pd.DataFrame:
+        '''Fills missing values with the fitted fill values, replacing only the columns that have missing values'''
+        if self.fill_values is None:
+            self.fill_values = self.compute_fill_values()
+        
+        df_cleaned = df if inplace else df.copy(deep=False)
+        missing_cols = df.columns[df.count() < len(df)]
+        for col in missing_cols:
+            if self.method == "constant":
+                column = df_cleaned[col]
+                # Categorical columns from compact ingestion only accept known categories
+                if isinstance(column.dtype, pd.CategoricalDtype) and self.fill_value not in column.cat.categories:
+                    column = column.cat.add_categories([self.fill_value])
+                df_cleaned[col] = column.fillna(self.fill_value)
+            elif col in self.fill_values.index:
+                df_cleaned[col] = df_cleaned[col].fillna(self.fill_values[col])
+        return df_cleaned
         
     def handle(self, df: pd.DataFrame) -> pd.DataFrame:
         
         logging.info(f"Filling missing values with {self.method}")
-        df_cleaned = df.copy()
+        df_cleaned = self.fit(df).transform(df)
+        logging.info("Missing values filled")
+        
+        return df_cleaned
+    
+    def partial_fit(self, df: pd.DataFrame):
+        '''Updates the streaming statistics with a chunk, memory stays constant whatever the number of rows'''
+        numeric_cols = df.select_dtypes(include=["number"]).columns
         
         if self.method == "mean":
-            numeric_cols = df.cleaned.select_dtypes(include=["number"]).columns
-            df_cleaned[numeric_cols]= df_cleaned[numeric_cols].fillna(df_cleaned[numeric_cols].mean())   
-            
-            
+            self.moments.update(df[numeric_cols])
+        
         elif self.method == "median":
-            numeric_cols = df.cleaned.select_dtypes(include=["number"]).columns
-            df_cleaned[numeric_cols]= df_cleaned[numeric_cols].fillna(df_cleaned[numeric_cols].median())
+            for col in numeric_cols:
+                self.sketches.setdefault(col, KLLSketch(self.sketch_size)).update(df[col].to_numpy(dtype=np.float64))
         
         elif self.method == "mode":
-            nummeric_cols = df.cleaned.select_dtypes(include=["number"]).columns
-            df_cleaned[numeric_cols]= df_cleaned[numeric_cols].fillna(df_cleaned[numeric_cols].mode().iloc[0], inplace=True) 
+            for col in numeric_cols:
+                self.frequent_items.setdefault(col, FrequentItems(self.max_counters)).update(df[col])
         
-        elif self.method == "constant":
-            df_cleaned = df.fillna(self.fill_value)
+        if self.categorical_method == "mode":
+            for col in df.select_dtypes(exclude=["number"]).columns:
+                self.frequent_items.setdefault(col, FrequentItems(self.max_counters)).update(df[col])
         
+        self.fill_values = None
+        return self
+    
+    def merge(self, other: "FillMissingValuesStrategy"):
+        '''Merges the streaming statistics accumulated by another strategy, e.g. in a worker process'''
+        self.moments.merge(other.moments)
+        for col, sketch in other.sketches.items():
+            if col in self.sketches:
+                self.sketches[col].merge(sketch)
+            else:
+                self.sketches[col] = sketch
+        for col, items in other.frequent_items.items():
+            if col in self.frequent_items:
+                self.frequent_items[col].merge(items)
+            else:
+                self.frequent_items[col] = items
+        self.fill_values = None
+        return self
+    
+    def compute_fill_values(self) -> pd.Series:
+        '''Computes the fill values from the streaming statistics'''
+        if self.method == "mean":
+            fill_values = self.moments.mean if self.moments.mean is not None else pd.Series(dtype=float)
+        elif self.method == "median":
+            fill_values = pd.Series({col: sketch.quantile(0.5) for col, sketch in self.sketches.items()}, dtype=float)
+        elif self.method in ["mode", "constant"]:
+            fill_values = pd.Series(dtype=float)
         else:
             raise ValueError(f"Unsupported method: {self.method}")
+        
+        modes = pd.Series({col: items.most_frequent() for col, items in self.frequent_items.items()}, dtype=object)
+        return pd.concat([fill_values.astype(object), modes]).dropna()
+    
+    def to_dict(self) -> dict:
+        '''Returns the fitted fill values as a json serializable dict'''
+        if self.fill_values is None:
+            self.fill_values = self.compute_fill_values()
+        return {
+            "method": self.method,
+            "fill_value": to_builtin(self.fill_value),
+            "categorical_method": self.categorical_method,
+            "fill_values": {col: to_builtin(value) for col, value in self.fill_values.items()},
+        }
+    
+    @classmethod
+    def from_dict(cls, state: dict):
+        '''Restores a fitted strategy from the dict returned by to_dict'''
+        strategy = cls(state["method"], state["fill_value"], state["categorical_method"])
+        strategy.fill_values = pd.Series(state["fill_values"], dtype=object)
+        return strategy
+    
+    def save(self, path: str):
+        '''Persists the fitted fill values as json so inference can reuse them'''
+        with open(path, "w") as state_file:
+            json.dump(self.to_dict(), state_file, indent=2)
+    
+    @classmethod
+    def load(cls, path: str):
+        '''Loads a fitted strategy persisted with save'''
+        with open(path) as state_file:
+            return cls.from_dict(json.load(state_file))
+    
+#Concrete class for filling Missing Values from the nearest complete rows
+class KNNFillMissingValuesStrategy(MissingValuesHandler):
+    def __init__(self, n_neighbors=5, weights="uniform", algorithm="kd_tree", features=None, exclude=("Order", "PID", "SalePrice"), batch_size=1024, n_jobs=None):
+        '''Fills numeric columns with the average of the nearest complete rows, found with a tree built once over features
+
+        features default to the numeric columns without missing values, the ID and target columns in exclude are
+        neither searched on nor imputed. batch_size rows are queried at a time on n_jobs threads (None uses the number of cores).
+        '''
+        if weights not in ["uniform", "distance"]:
+            raise ValueError(f"Unsupported weights: {weights}")
+        if algorithm not in ["kd_tree", "ball_tree"]:
+            raise ValueError(f"Unsupported algorithm: {algorithm}")
+        
+        self.n_neighbors = n_neighbors
+        self.weights = weights
+        self.algorithm = algorithm
+        self.features = features
+        self.exclude = list(exclude) if exclude is not None else []
+        self.batch_size = batch_size
+        self.n_jobs = n_jobs
+        self.tree = None
+    
+    def fit(self, df: pd.DataFrame):
+        '''Builds the neighbour index over the standardized features of the complete rows'''
+        logging.info(f"Building {self.algorithm} index for nearest neighbour imputation")
+        self.numeric_cols = [col for col in df.select_dtypes(include=["number"]).columns if col not in self.exclude]
+        if self.features is not None:
+            self.reference_cols = [col for col in self.features if col not in self.exclude]
+        else:
+            self.reference_cols = [col for col in self.numeric_cols if df[col].notna().all()]
+        if len(self.reference_cols) == 0:
+            raise ValueError("No complete numeric columns to search neighbours on")
+        
+        values = df[self.numeric_cols].to_numpy(dtype=np.float64)
+        complete = ~np.isnan(values).any(axis=1)
+        if not complete.any():
+            raise ValueError("No complete rows to impute from")
+        self.complete_values = values[complete]
+        
+        reference = df.loc[complete, self.reference_cols].to_numpy(dtype=np.float64)
+        self.reference_mean = reference.mean(axis=0)
+        self.reference_std = reference.std(axis=0)
+        self.reference_std[self.reference_std == 0] = 1
+        
+        tree_class = KDTree if self.algorithm == "kd_tree" else BallTree
+        self.tree = tree_class((reference - self.reference_mean) / self.reference_std)
+        logging.info(f"Index built over {complete.sum()} complete rows and {len(self.reference_cols)} features")
+        return self
+    
+    def query_batch(self, query: np.ndarray) -> np.ndarray:
+        '''Averages the numeric values of the nearest complete rows of a batch of standardized queries'''
+        distances, indices = self.tree.query(query, k=min(self.n_neighbors, len(self.complete_values)))
+        neighbours = self.complete_values[indices]
+        if self.weights == "distance":
+            weights = 1 / np.maximum(distances, 1e-12)
+            return (neighbours * weights[..., None]).sum(axis=1) / weights.sum(axis=1)[:, None]
+        return neighbours.mean(axis=1)
+    
+    def transform(self, df: pd.DataFrame, inplace: bool = False) -> pd.DataFrame:
+        '''Fills the missing numeric values of every incomplete row from its nearest complete rows'''
+        if self.tree is None:
+            raise ValueError("KNNFillMissingValuesStrategy must be fitted before transform")
+        
+        numeric_cols = [col for col in self.numeric_cols if col in df.columns]
+        values = df[numeric_cols].to_numpy(dtype=np.float64)
+        missing = np.isnan(values)
+        rows = np.flatnonzero(missing.any(axis=1))
+        df_cleaned = df if inplace else df.copy(deep=False)
+        if len(rows) == 0:
+            return df_cleaned
+        
+        # Missing query features fall back to the training mean, i.e. zero once standardized
+        query = (df[self.reference_cols].to_numpy(dtype=np.float64)[rows] - self.reference_mean) / self.reference_std
+        query[np.isnan(query)] = 0
+        
+        batches = [query[start:start + self.batch_size] for start in range(0, len(rows), self.batch_size)]
+        with ThreadPoolExecutor(max_workers=self.n_jobs) as executor:
+            imputed = np.vstack(list(executor.map(self.query_batch, batches)))
+        
+        col_positions = [self.numeric_cols.index(col) for col in numeric_cols]
+        row_values = values[rows]
+        row_missing = missing[rows]
+        row_values[row_missing] = imputed[:, col_positions][row_missing]
+        values[rows] = row_values
+        
+        for position in np.flatnonzero(missing.any(axis=0)):
+            df_cleaned[numeric_cols[position]] = values[:, position]
+        logging.info(f"Filled {len(rows)} incomplete rows from their {self.n_neighbors} nearest neighbours")
+        return df_cleaned
+    
+    def handle(self, df: pd.DataFrame) -> pd.DataFrame:
+        
+        logging.info("Filling missing values with nearest neighbours")
+        df_cleaned = self.fit(df).transform(df)
         logging.info("Missing values filled")
         
         return df_cleaned
@@ -1,7 +1,17 @@
 import os
+import glob
+import json
+import uuid
+import hashlib
+import logging
 import zipfile
+import fnmatch
+import shutil
 from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
+from src.chunked_pipeline import infer_chunk_dtypes
 
 # Abstract class for data ingestion
 class DataIngestion(ABC):
@@ -9,7 +19,49 @@ class DataIngestion(ABC):
     def ingest(self, file_path) -> pd.DataFrame:
         '''Abstract method to ingest data from a file'''
         pass
+    
+    def parse_options(self) -> dict:
+        '''Returns the options that determine the parsed frame, used to key cached datasets'''
+        return dict(vars(self))
+
 
+def evict_least_recently_used(cache_dir: str, max_bytes: int, keep: list = (), suffixes: tuple = (".parquet",), directories: bool = False):
+    '''Removes the least recently used entries of cache_dir until it fits in max_bytes, never removing keep
+
+    Files sharing a cache key (the name without its suffix) form one entry and are evicted together,
+    with directories=True every subdirectory is one entry as well.
+    '''
+    entries = {}
+    total = 0
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if directories and os.path.isdir(path):
+            files = [os.path.join(root, file) for root, _, names in os.walk(path) for file in names]
+            entry = entries.setdefault(name, {"mtime": os.path.getmtime(path), "size": 0, "paths": [path]})
+            entry["mtime"] = max([entry["mtime"]] + [os.path.getmtime(file) for file in files])
+            entry["size"] = sum(os.path.getsize(file) for file in files)
+            total += entry["size"]
+            continue
+        if not name.endswith(suffixes):
+            continue
+        size = os.path.getsize(path)
+        total += size
+        entry = entries.setdefault(os.path.splitext(name)[0], {"mtime": 0.0, "size": 0, "paths": []})
+        entry["mtime"] = max(entry["mtime"], os.path.getmtime(path))
+        entry["size"] += size
+        entry["paths"].append(path)
+    
+    evictable = [entry for entry in entries.values() if not any(path in keep for path in entry["paths"])]
+    for entry in sorted(evictable, key=lambda entry: entry["mtime"]):
+        if total <= max_bytes:
+            break
+        for path in entry["paths"]:
+            logging.info(f"Evicting cache entry {path}")
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        total -= entry["size"]
 
 #implement a concrete class for ingesting data from a zip file
 class ZipFileDataIngestion(DataIngestion):
@@ -38,11 +90,289 @@ class ZipFileDataIngestion(DataIngestion):
         
         return df
 
+#Concrete class for reading the csv member straight out of the zip file
+class ZipStreamDataIngestion(DataIngestion):
+    def __init__(self, member: str = None, pattern: str = "*.csv", chunksize: int = None, **read_csv_kwargs):
+        '''Reads the csv member without extracting the archive to disk'''
+        self.member = member
+        self.pattern = pattern
+        self.chunksize = chunksize
+        self.read_csv_kwargs = read_csv_kwargs
+    
+    def select_member(self, zip_ref: zipfile.ZipFile, file_path: str) -> str:
+        '''Picks the csv member by exact name or by glob pattern'''
+        names = [name for name in zip_ref.namelist() if not name.endswith("/")]
+        
+        if self.member is not None:
+            if self.member not in names:
+                raise FileNotFoundError(f"Member {self.member} not found in the zip file: {file_path}")
+            return self.member
+        
+        csv_files = [name for name in names if fnmatch.fnmatch(os.path.basename(name), self.pattern)]
+        
+        if len(csv_files) == 0:
+            raise FileNotFoundError(f"No CSV file matching {self.pattern} found in the zip file: {file_path}")
+        if len(csv_files) > 1:
+            raise ValueError(f"Multiple CSV files matching {self.pattern} found in the zip file: {file_path}")
+        return csv_files[0]
+    
+    def ingest_chunks(self, file_path: str):
+        '''Yields the csv member as DataFrames of at most chunksize rows'''
+        
+        if not file_path.endswith(".zip"):
+            raise FileNotFoundError(f"File not found: {file_path}")
+        
+        with zipfile.ZipFile(file_path, 'r') as zip_ref:
+            member = self.select_member(zip_ref, file_path)
+            with zip_ref.open(member) as csv_file:
+                if self.chunksize is None:
+                    yield pd.read_csv(csv_file, **self.read_csv_kwargs)
+                    return
+                with pd.read_csv(csv_file, chunksize=self.chunksize, **self.read_csv_kwargs) as reader:
+                    for chunk in reader:
+                        yield chunk
+    
+    def ingest(self, file_path: str) -> pd.DataFrame:
+        '''Parses the csv member of a zip file into a pandas DataFrame'''
+        chunks = list(self.ingest_chunks(file_path))
+        if len(chunks) == 1:
+            return chunks[0]
+        return pd.concat(chunks, ignore_index=True)
+
+#Concrete class for reading parquet files and caching parsed sources as parquet
+class ParquetDataIngestion(DataIngestion):
+    def __init__(self, source_ingestor: DataIngestion = None, cache_dir: str = ".ingest_cache", max_cache_bytes: int = 2 * 1024**3):
+        '''Caches the frame parsed by source_ingestor in cache_dir, keyed by source content and parse options'''
+        self.source_ingestor = source_ingestor
+        self.cache_dir = cache_dir
+        self.max_cache_bytes = max_cache_bytes
+    
+    def cache_key(self, file_path: str) -> str:
+        '''Hashes the source file content together with the parse options of the source ingestor'''
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as source:
+            for block in iter(lambda: source.read(1024 * 1024), b""):
+                digest.update(block)
+        options = {"ingestor": type(self.source_ingestor).__name__, "options": self.source_ingestor.parse_options()}
+        digest.update(json.dumps(options, sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+    
+    def evict(self, keep: str = None):
+        '''Removes the least recently used cache entries until the cache fits in max_cache_bytes'''
+        evict_least_recently_used(self.cache_dir, self.max_cache_bytes, keep=[keep] if keep else [])
+    
+    def ingest(self, file_path: str) -> pd.DataFrame:
+        '''Reads a parquet file, or the cached parquet copy of file_path parsed by the source ingestor'''
+        
+        if file_path.endswith(".parquet"):
+            return pd.read_parquet(file_path, memory_map=True)
+        
+        if self.source_ingestor is None:
+            raise ValueError(f"No source ingestor given to parse: {file_path}")
+        
+        os.makedirs(self.cache_dir, exist_ok=True)
+        cache_path = os.path.join(self.cache_dir, f"{self.cache_key(file_path)}.parquet")
+        
+        if os.path.exists(cache_path):
+            logging.info(f"Loading cached dataset {cache_path}")
+            os.utime(cache_path)
+            return pd.read_parquet(cache_path, memory_map=True)
+        
+        df = self.source_ingestor.ingest(file_path)
+        
+        # Write to a temporary file first so concurrent runs never read a partial entry
+        tmp_path = f"{cache_path}.{uuid.uuid4().hex}.tmp"
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, cache_path)
+        logging.info(f"Cached dataset {file_path} as {cache_path}")
+        
+        self.evict(keep=cache_path)
+        return df
+
+def read_shard(shard: tuple, read_csv_kwargs: dict) -> pd.DataFrame:
+    '''Reads one (file, member) shard, streaming the member out of the archive for zip files'''
+    file_path, member = shard
+    if member is not None:
+        return ZipStreamDataIngestion(member=member, **read_csv_kwargs).ingest(file_path)
+    return pd.read_csv(file_path, **read_csv_kwargs)
+
+#Concrete class for ingesting partitioned exports spread over many zip/csv shards
+class PartitionedDataIngestion(DataIngestion):
+    def __init__(self, pattern: str = "*.csv", max_workers: int = None, **read_csv_kwargs):
+        '''Reads every csv shard matching pattern in parallel, max_workers defaults to the number of cores'''
+        self.pattern = pattern
+        self.max_workers = max_workers
+        self.read_csv_kwargs = read_csv_kwargs
+    
+    def list_shards(self, path: str) -> list:
+        '''Lists the (file, member) shards of a directory or glob, member is None for plain csv files'''
+        if os.path.isdir(path):
+            files = glob.glob(os.path.join(path, "**", "*"), recursive=True)
+        else:
+            files = glob.glob(path, recursive=True)
+        
+        shards = []
+        for file_path in sorted(files):
+            if file_path.endswith(".zip"):
+                with zipfile.ZipFile(file_path, 'r') as zip_ref:
+                    members = sorted(name for name in zip_ref.namelist() if fnmatch.fnmatch(os.path.basename(name), self.pattern))
+                shards.extend((file_path, member) for member in members)
+            elif fnmatch.fnmatch(os.path.basename(file_path), self.pattern) and os.path.isfile(file_path):
+                shards.append((file_path, None))
+        
+        if len(shards) == 0:
+            raise FileNotFoundError(f"No CSV shards matching {self.pattern} found in: {path}")
+        return shards
+    
+    def check_schemas(self, shards: list, frames: list) -> dict:
+        '''Checks that every shard has the same columns and returns the dtypes they share'''
+        columns = list(frames[0].columns)
+        for shard, frame in zip(shards, frames):
+            if list(frame.columns) != columns:
+                raise ValueError(f"Shard {shard} has columns {list(frame.columns)}, expected {columns}")
+        return infer_chunk_dtypes(frames)
+    
+    def ingest(self, path: str) -> pd.DataFrame:
+        '''Parses all shards in a process pool and concatenates them into one DataFrame'''
+        shards = self.list_shards(path)
+        logging.info(f"Ingesting {len(shards)} shards from {path}")
+        
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            frames = list(executor.map(read_shard, shards, [self.read_csv_kwargs] * len(shards)))
+        
+        dtypes = self.check_schemas(shards, frames)
+        
+        # Only shards whose dtypes differ from the shared schema are cast, pd.concat then allocates the result once
+        frames = [
+            frame.astype({col: dtype for col, dtype in dtypes.items() if frame[col].dtype != dtype})
+            for frame in frames
+        ]
+        return pd.concat(frames, ignore_index=True)
+
+#Helper class for inferring and reapplying compact dtypes
+class DtypeOptimizer:
+    INTEGER_DTYPES = ("int8", "int16", "int32", "int64")
+    
+    def __init__(self, schema_path: str = None, max_category_ratio: float = 0.5):
+        '''Optimizes frames to the smallest lossless dtypes, persisting the inferred schema at schema_path'''
+        self.schema_path = schema_path
+        self.max_category_ratio = max_category_ratio
+        self.schema = None
+    
+    def load_schema(self) -> dict:
+        '''Loads the persisted schema, or an empty one if there is none yet'''
+        if self.schema_path is not None and os.path.exists(self.schema_path):
+            with open(self.schema_path) as schema_file:
+                return json.load(schema_file)
+        return {}
+    
+    def save_schema(self):
+        '''Persists the inferred schema as json'''
+        if self.schema_path is None:
+            return
+        os.makedirs(os.path.dirname(self.schema_path) or ".", exist_ok=True)
+        with open(self.schema_path, "w") as schema_file:
+            json.dump(self.schema, schema_file, indent=2, sort_keys=True)
+    
+    def is_lossless(self, series: pd.Series, dtype: str) -> bool:
+        '''Checks whether casting the series to dtype keeps every value'''
+        if dtype in ("category", "object"):
+            return True
+        if pd.api.types.is_bool_dtype(series.dtype) or not pd.api.types.is_numeric_dtype(series.dtype):
+            return dtype == str(series.dtype)
+        if dtype in self.INTEGER_DTYPES:
+            if series.isna().any():
+                return False
+            values = series.to_numpy()
+            if len(values) == 0:
+                return True
+            if not pd.api.types.is_integer_dtype(series.dtype) and not np.array_equal(values, np.round(values)):
+                return False
+            info = np.iinfo(dtype)
+            return info.min <= values.min() and values.max() <= info.max
+        if dtype == "float32":
+            values = series.to_numpy(dtype=np.float64)
+            with np.errstate(over="ignore"):
+                cast = values.astype(np.float32).astype(np.float64)
+            return bool(np.all((cast == values) | np.isnan(values)))
+        return dtype == str(series.dtype)
+    
+    def infer_dtype(self, series: pd.Series) -> str:
+        '''Infers the smallest lossless dtype for a column'''
+        if pd.api.types.is_bool_dtype(series.dtype):
+            return str(series.dtype)
+        if not pd.api.types.is_numeric_dtype(series.dtype):
+            if len(series) > 0 and series.nunique() <= self.max_category_ratio * len(series):
+                return "category"
+            return "object"
+        for dtype in self.INTEGER_DTYPES + ("float32",):
+            if self.is_lossless(series, dtype):
+                return dtype
+        return str(series.dtype)
+    
+    def optimize(self, df: pd.DataFrame) -> pd.DataFrame:
+        '''Applies the persisted schema, inferring dtypes for new columns or where the schema would lose values'''
+        if self.schema is None:
+            self.schema = self.load_schema()
+        memory_before = df.memory_usage(deep=True).sum()
+        
+        dtypes = {}
+        schema_changed = False
+        for col in df.columns:
+            dtype = self.schema.get(col)
+            if dtype is None or not self.is_lossless(df[col], dtype):
+                dtype = self.infer_dtype(df[col])
+                schema_changed = schema_changed or self.schema.get(col) != dtype
+                self.schema[col] = dtype
+            if dtype != str(df[col].dtype):
+                dtypes[col] = dtype
+        
+        df = df.astype(dtypes)
+        if schema_changed:
+            self.save_schema()
+        
+        memory_after = df.memory_usage(deep=True).sum()
+        logging.info(f"Optimized dtypes: {memory_before / 1024**2:.1f} MB -> {memory_after / 1024**2:.1f} MB")
+        return df
+
+#Concrete class for ingesting data with compact dtypes
+class OptimizedDataIngestion(DataIngestion):
+    def __init__(self, source_ingestor: DataIngestion, schema_path: str = None, max_category_ratio: float = 0.5):
+        '''Ingests with source_ingestor and optimizes the frame to compact dtypes'''
+        self.source_ingestor = source_ingestor
+        self.optimizer = DtypeOptimizer(schema_path, max_category_ratio)
+    
+    def parse_options(self) -> dict:
+        '''Returns the source parse options together with the optimizer settings'''
+        return {
+            "source": self.source_ingestor.parse_options(),
+            "schema_path": self.optimizer.schema_path,
+            "max_category_ratio": self.optimizer.max_category_ratio,
+        }
+    
+    def ingest(self, file_path: str) -> pd.DataFrame:
+        '''Ingests the file and converts it to the compact dtypes'''
+        return self.optimizer.optimize(self.source_ingestor.ingest(file_path))
+
 class DataIngestorFactory:
     @staticmethod
-    def get_data_ingestor(file_extension: str) -> DataIngestion:
+    def get_data_ingestor(file_extension: str, stream: bool = False, cache: bool = False, optimize_dtypes: bool = False, partitioned: bool = False, **kwargs) -> DataIngestion:
         """Returns the appropriate DataIngestor based on file extension."""
-        if file_extension == ".zip":
+        if partitioned:
+            return PartitionedDataIngestion(**kwargs)
+        elif file_extension == ".zip" and optimize_dtypes:
+            cache_options = {key: kwargs.pop(key) for key in ("cache_dir", "max_cache_bytes") if key in kwargs}
+            optimizer_options = {key: kwargs.pop(key) for key in ("schema_path", "max_category_ratio") if key in kwargs}
+            data_ingestor = OptimizedDataIngestion(ZipStreamDataIngestion(**kwargs), **optimizer_options)
+            return ParquetDataIngestion(data_ingestor, **cache_options) if cache else data_ingestor
+        elif file_extension == ".parquet":
+            return ParquetDataIngestion()
+        elif file_extension == ".zip" and cache:
+            cache_options = {key: kwargs.pop(key) for key in ("cache_dir", "max_cache_bytes") if key in kwargs}
+            return ParquetDataIngestion(ZipStreamDataIngestion(**kwargs), **cache_options)
+        elif file_extension == ".zip" and stream:
+            return ZipStreamDataIngestion(**kwargs)
+        elif file_extension == ".zip":
             return ZipFileDataIngestion()
         else:
             raise ValueError(f"No ingestor available for file extension: {file_extension}")
@@ -1,10 +1,29 @@
+import os
+import copy
+import json
+import uuid
+import hashlib
 import logging 
+import tempfile
 from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+import joblib
+import numpy as np
 import pandas as pd
-from sklearn.base import RegressorMixin
-from sklearn.linear_model import LinearRegression
+from scipy import sparse as sp
+from sklearn.base import BaseEstimator, RegressorMixin, clone
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import HistGradientBoostingRegressor
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import LinearRegression, Ridge, Lasso, ElasticNet, SGDRegressor, enet_path
+from sklearn.neighbors import KNeighborsRegressor
 from sklearn.pipeline import Pipeline
-from sklearn.preprocessing import StandardScaler
+from sklearn.preprocessing import FunctionTransformer, OneHotEncoder, OrdinalEncoder, StandardScaler
+from threadpoolctl import threadpool_limits
+from src.data_splitter import KFoldSplit
+from src.feature_engineering import sparse_frame_to_csr
+from src.ingest_data import evict_least_recently_used
+from src.streaming_statistics import RunningCrossProducts
 from typing import Any
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -16,6 +35,65 @@ class ModelBuildingStrategy(ABC):
         '''Builds the model'''
         pass
 
+def has_sparse_columns(X: pd.DataFrame) -> bool:
+    '''Checks whether the frame holds sparse (e.g. one-hot encoded) columns'''
+    return any(isinstance(dtype, pd.SparseDtype) for dtype in X.dtypes)
+
+def sparse_input_steps(X: pd.DataFrame) -> list:
+    '''Returns the pipeline steps that feed sparse columns to the model as CSR instead of densifying them'''
+    if not has_sparse_columns(X):
+        return [("scaler", StandardScaler())]
+    # Centering would densify the matrix, so sparse input is only scaled
+    return [("to_csr", FunctionTransformer(sparse_frame_to_csr, accept_sparse=True)), ("scaler", StandardScaler(with_mean=False))]
+
+def split_column_types(X: pd.DataFrame) -> tuple:
+    '''Returns the numerical, categorical and sparse (already one-hot encoded) columns'''
+    sparse_col = pd.Index([col for col in X.columns if isinstance(X[col].dtype, pd.SparseDtype)])
+    categorical_col = X.select_dtypes(include=["object", "category"]).columns
+    numerical_col = X.select_dtypes(exclude=["object", "category"]).columns.difference(sparse_col, sort=False)
+    return numerical_col, categorical_col, sparse_col
+
+def build_preprocessor(X: pd.DataFrame) -> ColumnTransformer:
+    '''Builds the imputation and one-hot encoding preprocessor for the raw feature frame'''
+    numerical_col, categorical_col, sparse_col = split_column_types(X)
+    categorical_transformers = Pipeline(
+        steps=[
+            ("imputer", SimpleImputer(strategy="most_frequent")),
+            ("encoder", OneHotEncoder(handle_unknown="ignore")),
+        ]
+    )
+    transformers = [
+        ("num", SimpleImputer(strategy="mean"), numerical_col),
+        ("cat", categorical_transformers, categorical_col),
+    ]
+    
+    #Sparse columns are passed to the model as CSR, so the whole design matrix stays sparse
+    if len(sparse_col):
+        transformers.append(("sparse", FunctionTransformer(sparse_frame_to_csr, accept_sparse=True), sparse_col))
+    return ColumnTransformer(transformers=transformers, sparse_threshold=1.0 if len(sparse_col) else 0.3)
+
+def share_matrix(X, directory: str) -> dict:
+    '''Writes a dense or sparse matrix once to .npy files and returns the handle workers reopen it from'''
+    if sp.issparse(X):
+        X = sp.csr_matrix(X)
+        parts = {"data": X.data, "indices": X.indices, "indptr": X.indptr}
+        handle = {"format": "csr", "shape": X.shape}
+    else:
+        parts = {"data": np.ascontiguousarray(X, dtype=np.float64)}
+        handle = {"format": "dense", "shape": parts["data"].shape}
+    for name, values in parts.items():
+        path = os.path.join(directory, f"{name}.npy")
+        np.save(path, values)
+        handle[name] = path
+    return handle
+
+def open_matrix(handle: dict):
+    '''Reopens a shared matrix memory-mapped read-only, so workers never hold a private copy of it'''
+    if handle["format"] == "dense":
+        return np.load(handle["data"], mmap_mode="r")
+    parts = tuple(np.load(handle[name], mmap_mode="r") for name in ("data", "indices", "indptr"))
+    return sp.csr_matrix(parts, shape=handle["shape"], copy=False)
+
 # Concrete class for Linear Regression Model Building
 class LinearRegressionStrategy(ModelBuildingStrategy):    
     def build_and_train_model(self, X_train: pd.DataFrame, y_train: pd.Series) -> Pipeline:
@@ -32,8 +110,7 @@ class LinearRegressionStrategy(ModelBuildingStrategy):
         
         #Create a pipeline with standard scaler and linear regression
         
-        pipeline = Pipeline([
-            ("scaler", StandardScaler()),
+        pipeline = Pipeline(sparse_input_steps(X_train) + [
             ("model", LinearRegression())
         ])
         logging.info("Pipeline created")
@@ -41,6 +118,519 @@ class LinearRegressionStrategy(ModelBuildingStrategy):
         logging.info("Model trained")
         return pipeline
 
+# Concrete class for SGD Regression, trainable on chunks that do not fit in memory
+class SGDRegressionStrategy(ModelBuildingStrategy):
+    def __init__(self, n_epochs: int = 5, **sgd_params):
+        '''Initializes the strategy with the number of passes over the chunks and the SGDRegressor parameters'''
+        self.n_epochs = n_epochs
+        self.sgd_params = sgd_params
+    
+    def build_and_train_model(self, X_train: pd.DataFrame, y_train: pd.Series) -> Pipeline:
+        '''Builds and trains the SGD regression model'''
+        
+        if not isinstance(X_train, pd.DataFrame):
+            raise ValueError("X_train must be a pandas DataFrame")
+        if not isinstance(y_train, pd.Series):
+            raise ValueError("y_train must be a pandas Series")
+        
+        pipeline = Pipeline(sparse_input_steps(X_train) + [
+            ("model", SGDRegressor(**self.sgd_params))
+        ])
+        pipeline.fit(X_train, y_train)
+        logging.info("Model trained")
+        return pipeline
+    
+    def build_and_train_model_on_chunks(self, chunk_source) -> Pipeline:
+        '''Trains the scaler and the SGD regression model with partial_fit, one chunk at a time'''
+        scaler = StandardScaler()
+        for X_chunk, _ in chunk_source():
+            scaler.partial_fit(X_chunk)
+        logging.info("Scaler fitted on chunks")
+        
+        model = SGDRegressor(**self.sgd_params)
+        for epoch in range(self.n_epochs):
+            for X_chunk, y_chunk in chunk_source():
+                model.partial_fit(scaler.transform(X_chunk), y_chunk)
+            logging.info(f"Epoch {epoch + 1}/{self.n_epochs} completed")
+        
+        return Pipeline([("scaler", scaler), ("model", model)])
+    
+    def update_model(self, pipeline: Pipeline, X_new, y_new) -> Pipeline:
+        '''Continues training the SGD model of a pipeline on new rows with partial_fit,
+        every step in front of it (imputers, encoders, scaler) keeps its fitted state'''
+        updated = copy.deepcopy(pipeline)
+        regression, X_design = transform_to_innermost(updated, X_new)
+        for _, step in regression.steps[:-1]:
+            X_design = step.transform(X_design)
+        model = regression.steps[-1][1]
+        if not hasattr(model, "partial_fit"):
+            raise ValueError(f"{type(model).__name__} cannot be updated with partial_fit")
+        
+        for epoch in range(self.n_epochs):
+            model.partial_fit(X_design, y_new)
+        logging.info(f"Model updated on {len(y_new)} new rows")
+        return updated
+
+def design_array(X) -> np.ndarray:
+    '''Returns a block of a frame, array or sparse matrix as a dense float64 array'''
+    if isinstance(X, pd.DataFrame):
+        return X.to_numpy(dtype=np.float64)
+    if sp.issparse(X):
+        X = X.toarray()
+    return np.asarray(X, dtype=np.float64)
+
+def row_batches(X, y, batch_size: int):
+    '''Yields (X, y) blocks of batch_size rows of a frame, array or sparse matrix'''
+    y = np.asarray(y, dtype=np.float64)
+    for start in range(0, X.shape[0], batch_size):
+        X_batch = X.iloc[start:start + batch_size] if isinstance(X, pd.DataFrame) else X[start:start + batch_size]
+        yield X_batch, y[start:start + batch_size]
+
+def transform_to_innermost(pipeline: Pipeline, X) -> tuple:
+    '''Passes X through the fitted steps in front of the innermost pipeline, the one ending with the final estimator'''
+    while isinstance(pipeline.steps[-1][1], Pipeline):
+        for _, step in pipeline.steps[:-1]:
+            X = step.transform(X)
+        pipeline = pipeline.steps[-1][1]
+    return pipeline, X
+
+def chunk_cross_products(X_chunk, y_chunk) -> RunningCrossProducts:
+    '''Computes the cross products of one chunk, run by the pool workers'''
+    return RunningCrossProducts().update(design_array(X_chunk), np.asarray(y_chunk, dtype=np.float64))
+
+# Concrete class for Linear Regression from accumulated sufficient statistics, trainable on chunks
+class StreamingLinearRegressionStrategy(ModelBuildingStrategy):
+    def __init__(self, alpha: float = 0.0, batch_size: int = 100_000, n_jobs: int = None):
+        '''Solves the normal equations of the standardized features, alpha > 0 adds a ridge penalty.
+        In-memory data is accumulated batch_size rows at a time, n_jobs threads compute the chunk cross products.'''
+        self.alpha = alpha
+        self.batch_size = batch_size
+        self.n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+    
+    def accumulate(self, chunks) -> tuple:
+        '''Merges the cross products of (X, y) chunks, keeping at most n_jobs chunks in flight'''
+        stats, columns = RunningCrossProducts(), None
+        if self.n_jobs is None or self.n_jobs <= 1:
+            for X_chunk, y_chunk in chunks:
+                columns = list(X_chunk.columns) if isinstance(X_chunk, pd.DataFrame) else None
+                stats.merge(chunk_cross_products(X_chunk, y_chunk))
+            return stats, columns
+        
+        with ThreadPoolExecutor(max_workers=self.n_jobs) as executor:
+            pending = set()
+            for X_chunk, y_chunk in chunks:
+                columns = list(X_chunk.columns) if isinstance(X_chunk, pd.DataFrame) else None
+                if len(pending) >= self.n_jobs:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        stats.merge(future.result())
+                pending.add(executor.submit(chunk_cross_products, X_chunk, y_chunk))
+            for future in pending:
+                stats.merge(future.result())
+        return stats, columns
+    
+    def solve(self, stats: RunningCrossProducts, columns: list, alpha: float = None) -> Pipeline:
+        '''Solves for the coefficients of the standardized features and returns a fitted scaler and model pipeline,
+        alpha overrides the penalty of the strategy'''
+        alpha = self.alpha if alpha is None else alpha
+        if stats.n == 0:
+            raise ValueError("No training rows to fit the model on")
+        
+        scale = np.sqrt(stats.variance())
+        scale[scale < 10 * np.finfo(np.float64).eps] = 1.0
+        czz = stats.cxx / np.outer(scale, scale)
+        czy = stats.cxy / scale
+        if alpha > 0:
+            coef = np.linalg.solve(czz + alpha * np.eye(len(scale)), czy)
+        else:
+            # Least squares on the normal equations gives the minimum norm solution when features are collinear
+            coef = np.linalg.lstsq(czz, czy, rcond=None)[0]
+        
+        # Centring is folded into the intercept, so sparse design matrices are scaled without densifying
+        scaler = StandardScaler(with_mean=False)
+        scaler.mean_, scaler.var_, scaler.scale_ = stats.mean_x.copy(), stats.variance(), scale
+        scaler.n_samples_seen_ = stats.n
+        scaler.n_features_in_ = len(scale)
+        if columns is not None:
+            scaler.feature_names_in_ = np.asarray(columns, dtype=object)
+        
+        model = Ridge(alpha=alpha) if alpha > 0 else LinearRegression()
+        model.coef_, model.intercept_ = coef, stats.mean_y - (stats.mean_x / scale) @ coef
+        model.n_features_in_ = len(scale)
+        # The statistics travel with the model so later rows can be merged in without the history
+        model.cross_products_ = stats
+        logging.info(f"Normal equations solved on {stats.n} rows and {len(scale)} features")
+        return Pipeline([("scaler", scaler), ("model", model)])
+    
+    def build_and_train_model(self, X_train: pd.DataFrame, y_train: pd.Series) -> Pipeline:
+        '''Builds and trains the model from batches of the in-memory data'''
+        
+        if not isinstance(X_train, pd.DataFrame):
+            raise ValueError("X_train must be a pandas DataFrame")
+        if not isinstance(y_train, pd.Series):
+            raise ValueError("y_train must be a pandas Series")
+        
+        return self.solve(*self.accumulate(row_batches(X_train, y_train, self.batch_size)))
+    
+    def build_and_train_model_on_matrix(self, X, y) -> Pipeline:
+        '''Trains the model on an already preprocessed dense or sparse matrix'''
+        return self.solve(*self.accumulate(row_batches(X, y, self.batch_size)))
+    
+    def build_and_train_model_on_chunks(self, chunk_source) -> Pipeline:
+        '''Trains the model in a single pass over the chunks'''
+        return self.solve(*self.accumulate(chunk_source()))
+    
+    def update_model(self, pipeline: Pipeline, X_new, y_new) -> Pipeline:
+        '''Merges the cross products of new rows into a pipeline trained by this strategy and solves again,
+        the fitted steps in front of the regression (imputers, encoders) are reused so the design matrix is unchanged'''
+        updated = copy.deepcopy(pipeline)
+        regression, X_design = transform_to_innermost(updated, X_new)
+        model = regression.steps[-1][1]
+        if not hasattr(model, "cross_products_"):
+            raise ValueError(f"{type(model).__name__} carries no cross products, train it once with StreamingLinearRegressionStrategy")
+        
+        new_stats, columns = self.accumulate(row_batches(X_design, y_new, self.batch_size))
+        logging.info(f"Merging {new_stats.n} new rows into a model trained on {model.cross_products_.n} rows")
+        stats = copy.deepcopy(model.cross_products_).merge(new_stats)
+        # The production penalty is kept, a LinearRegression was trained without one
+        regression.steps = self.solve(stats, columns, alpha=getattr(model, "alpha", 0.0)).steps
+        return updated
+
+# Concrete class for Histogram Gradient Boosting on ordinal coded categoricals
+class HistGradientBoostingStrategy(ModelBuildingStrategy):
+    def __init__(self, max_iter: int = 500, learning_rate: float = 0.1, max_leaf_nodes: int = 31, early_stopping: bool = True,
+                 validation_fraction: float = 0.1, n_iter_no_change: int = 20, n_threads: int = None, random_state: int = 42):
+        '''Feeds ordinal coded categoricals to the booster's native categorical splits instead of one-hot columns,
+        early stopping holds out validation_fraction of the rows, n_threads caps the OpenMP threads of fit'''
+        self.max_iter = max_iter
+        self.learning_rate = learning_rate
+        self.max_leaf_nodes = max_leaf_nodes
+        self.early_stopping = early_stopping
+        self.validation_fraction = validation_fraction
+        self.n_iter_no_change = n_iter_no_change
+        self.n_threads = n_threads
+        self.random_state = random_state
+    
+    def build_pipeline(self, X: pd.DataFrame) -> Pipeline:
+        '''Builds the unfitted preprocessor (numerical columns as is, categoricals ordinal coded) and booster pipeline'''
+        numerical_col, categorical_col, sparse_col = split_column_types(X)
+        # Missing and unseen categories become NaN, which the booster routes natively
+        encoder = OrdinalEncoder(
+            handle_unknown="use_encoded_value", unknown_value=np.nan, encoded_missing_value=np.nan, max_categories=255
+        )
+        # The booster bins a float64 copy of its input whatever the dtype, so the matrix is handed over as is
+        preprocessor = ColumnTransformer(
+            transformers=[
+                ("num", "passthrough", numerical_col.append(sparse_col)),
+                ("cat", encoder, categorical_col),
+            ],
+            sparse_threshold=0,
+        )
+        
+        n_numerical = len(numerical_col) + len(sparse_col)
+        model = HistGradientBoostingRegressor(
+            max_iter=self.max_iter,
+            learning_rate=self.learning_rate,
+            max_leaf_nodes=self.max_leaf_nodes,
+            early_stopping=self.early_stopping,
+            validation_fraction=self.validation_fraction,
+            n_iter_no_change=self.n_iter_no_change,
+            categorical_features=[False] * n_numerical + [True] * len(categorical_col),
+            random_state=self.random_state,
+        )
+        return Pipeline([("preprocessor", preprocessor), ("model", model)])
+    
+    def build_and_train_model(self, X_train: pd.DataFrame, y_train: pd.Series) -> Pipeline:
+        '''Builds and trains the gradient boosting pipeline'''
+        
+        if not isinstance(X_train, pd.DataFrame):
+            raise ValueError("X_train must be a pandas DataFrame")
+        if not isinstance(y_train, pd.Series):
+            raise ValueError("y_train must be a pandas Series")
+        
+        pipeline = self.build_pipeline(X_train)
+        with threadpool_limits(limits=self.n_threads, user_api="openmp"):
+            pipeline.fit(X_train, y_train)
+        logging.info(f"Model trained with {pipeline.named_steps['model'].n_iter_} boosting iterations")
+        return pipeline
+
+def regularization_path_errors(family: str, l1_ratio: float, alphas: np.ndarray, handle: dict, target_path: str,
+                               train_index: np.ndarray, test_index: np.ndarray, max_iter: int) -> np.ndarray:
+    '''Fits a whole regularization path on one fold of the shared matrix and returns the validation mse of every alpha,
+    run by the pool workers. Ridge paths reuse one SVD, Lasso and ElasticNet paths warm start from the previous alpha.'''
+    X, y = open_matrix(handle), np.load(target_path, mmap_mode="r")
+    X_train, X_test, y_train, y_test = np.asarray(X[train_index]), np.asarray(X[test_index]), y[train_index], y[test_index]
+    mean_x, mean_y = X_train.mean(axis=0), y_train.mean()
+    X_centred, y_centred = X_train - mean_x, y_train - mean_y
+    
+    if family == "ridge":
+        U, S, Vt = np.linalg.svd(X_centred, full_matrices=False)
+        coefs = Vt.T @ (S[:, None] / (S[:, None] ** 2 + alphas[None, :]) * (U.T @ y_centred)[:, None])
+    else:
+        _, coefs, _ = enet_path(X_centred, y_centred, l1_ratio=l1_ratio, alphas=alphas, max_iter=max_iter)
+    
+    predictions = (X_test - mean_x) @ coefs + mean_y
+    return ((predictions - y_test[:, None]) ** 2).mean(axis=0)
+
+# Concrete class searching Ridge, Lasso and ElasticNet regularization paths
+class RegularizedSearchStrategy(ModelBuildingStrategy):
+    def __init__(self, families=("ridge", "lasso", "elasticnet"), l1_ratios=(0.1, 0.5, 0.9), n_alphas: int = 30,
+                 eps: float = 1e-3, ridge_alphas=None, cv: int = 5, max_iter: int = 5000, n_jobs: int = None, random_state: int = 42):
+        '''Cross-validates a path of n_alphas for every (family, l1_ratio) on one scaled matrix and refits the best model,
+        the (family, l1_ratio, fold) paths are spread across n_jobs worker processes'''
+        self.families = list(families)
+        self.l1_ratios = list(l1_ratios)
+        self.n_alphas = n_alphas
+        self.eps = eps
+        self.ridge_alphas = np.logspace(-2, 5, n_alphas) if ridge_alphas is None else np.asarray(ridge_alphas, dtype=float)
+        self.cv = cv
+        self.max_iter = max_iter
+        self.n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+        self.random_state = random_state
+        self.search_table = None
+    
+    def grid(self, X: np.ndarray, y: np.ndarray) -> list:
+        '''Returns (family, l1_ratio, decreasing alphas), l1 paths start at the smallest alpha zeroing every coefficient'''
+        correlations = np.abs((X - X.mean(axis=0)).T @ (y - y.mean())).max() / len(y)
+        grid = []
+        for family in self.families:
+            if family == "ridge":
+                grid.append((family, 0.0, np.sort(self.ridge_alphas)[::-1]))
+                continue
+            if family not in ["lasso", "elasticnet"]:
+                raise ValueError(f"Unsupported model family: {family}")
+            for l1_ratio in ([1.0] if family == "lasso" else self.l1_ratios):
+                alpha_max = correlations / l1_ratio
+                grid.append((family, l1_ratio, np.geomspace(alpha_max, alpha_max * self.eps, self.n_alphas)))
+        return grid
+    
+    def make_model(self, family: str, l1_ratio: float, alpha: float) -> RegressorMixin:
+        '''Returns the unfitted estimator of a grid point'''
+        if family == "ridge":
+            return Ridge(alpha=alpha)
+        if family == "lasso":
+            return Lasso(alpha=alpha, max_iter=self.max_iter)
+        return ElasticNet(alpha=alpha, l1_ratio=l1_ratio, max_iter=self.max_iter)
+    
+    def search(self, X, y) -> tuple:
+        '''Searches the grid on a feature frame or a preprocessed matrix and returns the unfitted best pipeline
+        (scaler and model) together with the search table sorted by validation mse'''
+        input_steps = sparse_input_steps(X) if isinstance(X, pd.DataFrame) else [("scaler", StandardScaler(with_mean=not sp.issparse(X)))]
+        design = clone(Pipeline(input_steps)).fit_transform(X)
+        # Centring the folds densifies the matrix anyway
+        design = design.toarray() if sp.issparse(design) else np.asarray(design, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        grid = self.grid(design, y)
+        folds = list(KFoldSplit(n_splits=self.cv, random_state=self.random_state).split_indices(design))
+        
+        with tempfile.TemporaryDirectory(prefix="search_") as directory:
+            handle = share_matrix(design, directory)
+            target_path = os.path.join(directory, "target.npy")
+            np.save(target_path, y)
+            tasks = [
+                (family, l1_ratio, alphas, handle, target_path, train_index, test_index, self.max_iter)
+                for family, l1_ratio, alphas in grid for train_index, test_index in folds
+            ]
+            logging.info(f"Searching {len(grid)} regularization paths over {len(folds)} folds")
+            if self.n_jobs is None or self.n_jobs <= 1:
+                errors = [regularization_path_errors(*task) for task in tasks]
+            else:
+                with ProcessPoolExecutor(max_workers=self.n_jobs) as executor:
+                    errors = list(executor.map(regularization_path_errors, *zip(*tasks)))
+        
+        rows = []
+        for g, (family, l1_ratio, alphas) in enumerate(grid):
+            fold_errors = np.vstack(errors[g * len(folds):(g + 1) * len(folds)])
+            for a, alpha in enumerate(alphas):
+                rows.append({
+                    "family": family, "l1_ratio": l1_ratio, "alpha": alpha,
+                    "mse_mean": fold_errors[:, a].mean(), "mse_std": fold_errors[:, a].std(),
+                })
+        table = pd.DataFrame(rows).sort_values("mse_mean", kind="stable").reset_index(drop=True)
+        best = table.iloc[0]
+        logging.info(f"Best model: {best.family} with alpha {best.alpha:.6g} and l1_ratio {best.l1_ratio}, cv mse {best.mse_mean:.6g}")
+        return Pipeline(input_steps + [("model", self.make_model(best.family, best.l1_ratio, best.alpha))]), table
+    
+    def build_and_train_model(self, X_train: pd.DataFrame, y_train: pd.Series) -> Pipeline:
+        '''Searches the grid and refits the best pipeline on all the training data, the table is kept in search_table'''
+        
+        if not isinstance(X_train, pd.DataFrame):
+            raise ValueError("X_train must be a pandas DataFrame")
+        if not isinstance(y_train, pd.Series):
+            raise ValueError("y_train must be a pandas Series")
+        
+        pipeline, self.search_table = self.search(X_train, y_train)
+        pipeline.fit(X_train, y_train)
+        logging.info("Model trained")
+        return pipeline
+
+# Concrete class for any regressor behind the shared preprocessor
+class PreprocessedModelStrategy(ModelBuildingStrategy):
+    def __init__(self, model: RegressorMixin):
+        '''Imputes and one-hot encodes the raw frame like model_building_step, scales it and fits a copy of model'''
+        self.model = model
+    
+    def build_and_train_model(self, X_train: pd.DataFrame, y_train: pd.Series) -> Pipeline:
+        '''Builds and trains the preprocessor, scaler and model pipeline'''
+        
+        if not isinstance(X_train, pd.DataFrame):
+            raise ValueError("X_train must be a pandas DataFrame")
+        if not isinstance(y_train, pd.Series):
+            raise ValueError("y_train must be a pandas Series")
+        
+        pipeline = Pipeline([
+            ("preprocessor", build_preprocessor(X_train)),
+            ("scaler", StandardScaler(with_mean=False)),
+            ("model", clone(self.model)),
+        ])
+        pipeline.fit(X_train, y_train)
+        return pipeline
+
+#Stacked regressor combining fitted base pipelines with a meta model
+class StackedRegressor(RegressorMixin, BaseEstimator):
+    def __init__(self, base_models: list, meta_model: RegressorMixin):
+        '''base_models is a list of (name, fitted pipeline), the meta model is fitted on their predictions in that order'''
+        self.base_models = base_models
+        self.meta_model = meta_model
+    
+    def __sklearn_is_fitted__(self) -> bool:
+        '''The stacked regressor is only ever built from fitted models'''
+        return True
+    
+    def base_predictions(self, X: pd.DataFrame) -> np.ndarray:
+        '''Returns one column of predictions per base model'''
+        return np.column_stack([model.predict(X) for _, model in self.base_models])
+    
+    def fit(self, X: pd.DataFrame, y: pd.Series) -> "StackedRegressor":
+        '''Refits only the meta model on the predictions of the fitted base models'''
+        self.meta_model = clone(self.meta_model).fit(self.base_predictions(X), y)
+        return self
+    
+    def predict(self, X: pd.DataFrame) -> np.ndarray:
+        '''Predicts with the meta model over the base model predictions'''
+        return self.meta_model.predict(self.base_predictions(X))
+
+def save_atomically(path: str, save):
+    '''Writes a cache file through a temporary file so readers never see a partial one'''
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "wb") as cache_file:
+        save(cache_file)
+    os.replace(tmp_path, path)
+
+def fit_base_learner(data_path: str, target: str, name: str, strategy: ModelBuildingStrategy, fold: int,
+                     train_index: np.ndarray, test_index: np.ndarray, entry_dir: str) -> str:
+    '''Fits a base learner on the training rows of a fold and caches its predictions of the held-out rows,
+    or with fold None fits it on every row and caches the model, run by the pool workers'''
+    data = pd.read_pickle(data_path)
+    X, y = data.drop(columns=[target]), data[target]
+    if fold is None:
+        path = os.path.join(entry_dir, f"{name}.joblib")
+        model = strategy.build_and_train_model(X, y)
+        save_atomically(path, lambda cache_file: joblib.dump(model, cache_file))
+    else:
+        path = os.path.join(entry_dir, f"{name}_fold{fold}.npy")
+        model = strategy.build_and_train_model(X.iloc[train_index], y.iloc[train_index])
+        predictions = model.predict(X.iloc[test_index])
+        save_atomically(path, lambda cache_file: np.save(cache_file, predictions))
+    return path
+
+# Concrete class stacking linear, boosted and KNN regressors
+class StackingEnsembleStrategy(ModelBuildingStrategy):
+    def __init__(self, base_learners: dict = None, meta_model: RegressorMixin = None, cv: int = 5, n_jobs: int = None,
+                 cache_dir: str = ".stacking_cache", max_cache_bytes: int = 1024**3, random_state: int = 42):
+        '''Fits every (base learner, fold) and the full base models concurrently on n_jobs worker processes,
+        their out-of-fold predictions are cached in cache_dir so changing meta_model does not refit any base model.
+        Least recently used cache entries are evicted beyond max_cache_bytes.'''
+        self.base_learners = base_learners if base_learners is not None else {
+            "ridge": PreprocessedModelStrategy(Ridge(alpha=10.0)),
+            "hist_gbm": HistGradientBoostingStrategy(),
+            "knn": PreprocessedModelStrategy(KNeighborsRegressor(n_neighbors=10, weights="distance")),
+        }
+        self.meta_model = meta_model if meta_model is not None else LinearRegression(positive=True)
+        self.cv = cv
+        self.n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+        self.cache_dir = cache_dir
+        self.max_cache_bytes = max_cache_bytes
+        self.random_state = random_state
+        self.base_scores = {}
+    
+    def fingerprint(self, X: pd.DataFrame, y: pd.Series) -> str:
+        '''Hashes the training data with the base learners and folds, the meta model is left out on purpose'''
+        digest = hashlib.sha256()
+        digest.update(pd.util.hash_pandas_object(X, index=False).to_numpy().tobytes())
+        digest.update(pd.util.hash_pandas_object(y, index=False).to_numpy().tobytes())
+        digest.update(str(list(X.columns)).encode())
+        config = {
+            "base_learners": {name: [type(strategy).__name__, vars(strategy)] for name, strategy in self.base_learners.items()},
+            "cv": self.cv,
+            "random_state": self.random_state,
+        }
+        digest.update(json.dumps(config, sort_keys=True, default=repr).encode())
+        return digest.hexdigest()
+    
+    def fit_base_learners(self, X: pd.DataFrame, y: pd.Series, folds: list, entry_dir: str):
+        '''Fits the missing (base learner, fold) and full base models, the data is written once for all workers'''
+        target = "__target__"
+        tasks = []
+        for name, strategy in self.base_learners.items():
+            for fold, (train_index, test_index) in enumerate(folds):
+                if not os.path.exists(os.path.join(entry_dir, f"{name}_fold{fold}.npy")):
+                    tasks.append((name, strategy, fold, train_index, test_index))
+            if not os.path.exists(os.path.join(entry_dir, f"{name}.joblib")):
+                tasks.append((name, strategy, None, None, None))
+        if not tasks:
+            logging.info("Base learner predictions loaded from cache")
+            return
+        
+        logging.info(f"Fitting {len(tasks)} base learner tasks on {self.n_jobs or 1} workers")
+        with tempfile.TemporaryDirectory(prefix="stacking_") as directory:
+            data_path = os.path.join(directory, "data.pkl")
+            X.assign(**{target: y.to_numpy()}).to_pickle(data_path)
+            tasks = [(data_path, target, *task, entry_dir) for task in tasks]
+            if self.n_jobs is None or self.n_jobs <= 1:
+                for task in tasks:
+                    fit_base_learner(*task)
+            else:
+                with ProcessPoolExecutor(max_workers=self.n_jobs) as executor:
+                    list(executor.map(fit_base_learner, *zip(*tasks)))
+    
+    def out_of_fold_predictions(self, n_rows: int, folds: list, entry_dir: str) -> pd.DataFrame:
+        '''Assembles the cached held-out predictions of every base learner into one column per learner'''
+        predictions = {}
+        for name in self.base_learners:
+            column = np.empty(n_rows)
+            for fold, (_, test_index) in enumerate(folds):
+                column[test_index] = np.load(os.path.join(entry_dir, f"{name}_fold{fold}.npy"))
+            predictions[name] = column
+        return pd.DataFrame(predictions)
+    
+    def build_and_train_model(self, X_train: pd.DataFrame, y_train: pd.Series) -> Pipeline:
+        '''Fits (or loads) the base learners, fits the meta model on their out-of-fold predictions
+        and returns a single pipeline'''
+        
+        if not isinstance(X_train, pd.DataFrame):
+            raise ValueError("X_train must be a pandas DataFrame")
+        if not isinstance(y_train, pd.Series):
+            raise ValueError("y_train must be a pandas Series")
+        
+        entry_dir = os.path.join(self.cache_dir, self.fingerprint(X_train, y_train))
+        os.makedirs(entry_dir, exist_ok=True)
+        # Touching the entry marks it recently used even when every prediction is loaded from cache
+        os.utime(entry_dir)
+        folds = list(KFoldSplit(n_splits=self.cv, random_state=self.random_state).split_indices(X_train))
+        self.fit_base_learners(X_train, y_train, folds, entry_dir)
+        evict_least_recently_used(self.cache_dir, self.max_cache_bytes, keep=[entry_dir], directories=True)
+        
+        oof = self.out_of_fold_predictions(len(X_train), folds, entry_dir)
+        y = y_train.to_numpy(dtype=np.float64)
+        self.base_scores = {f"{name}_oof_mse": float(((oof[name].to_numpy() - y) ** 2).mean()) for name in oof.columns}
+        logging.info(f"Base learner out-of-fold mse: {self.base_scores}")
+        
+        meta_model = clone(self.meta_model).fit(oof.to_numpy(), y)
+        base_models = [(name, joblib.load(os.path.join(entry_dir, f"{name}.joblib"))) for name in self.base_learners]
+        # The base pipelines do their own preprocessing, the identity preprocessor keeps the preprocessor/model layout
+        return Pipeline([("preprocessor", FunctionTransformer()), ("model", StackedRegressor(base_models, meta_model))])
+
 class ModelBuilder:
     def __init__(self, strategy: ModelBuildingStrategy):
         '''Initializes the ModelBuilder with a strategy'''
@@ -55,6 +645,22 @@ class ModelBuilder:
         logging.info("Building and training model on selected strategy")
         
         return self.strategy.build_and_train_model(X_train, y_train)
+    
+    def execute_build_and_train_on_chunks(self, chunk_source) -> RegressorMixin:
+        '''Executes the strategy to build and train the model on (X, y) chunks'''
+        logging.info("Building and training model on chunks")
+        
+        if not hasattr(self.strategy, "build_and_train_model_on_chunks"):
+            raise ValueError(f"{type(self.strategy).__name__} cannot be trained on chunks")
+        return self.strategy.build_and_train_model_on_chunks(chunk_source)
+    
+    def execute_incremental_update(self, model: Pipeline, X_new: pd.DataFrame, y_new: pd.Series) -> Pipeline:
+        '''Executes the strategy to update a trained model, e.g. the production one, with new rows only'''
+        logging.info("Updating model incrementally on selected strategy")
+        
+        if not hasattr(self.strategy, "update_model"):
+            raise ValueError(f"{type(self.strategy).__name__} cannot update a trained model")
+        return self.strategy.update_model(model, X_new, y_new)
         
         
     
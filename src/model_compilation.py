@@ -0,0 +1,157 @@
+import logging
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Linear model compiled out of a fitted preprocessor/model pipeline, scoring needs NumPy only
+class CompiledLinearModel:
+    def __init__(self, intercept: float, coef: np.ndarray, numeric_columns: list, numeric_fill: np.ndarray,
+                 numeric_index: np.ndarray, categorical_columns: list, categorical_fill: list, categories: list,
+                 category_index: list):
+        '''numeric_fill holds the imputation values (NaN where a column is not imputed) and numeric_index the
+        coefficients of the numeric columns, categories holds the sorted categories of every categorical column and
+        category_index the coefficient each of them selects, coef carries the scaling of the pipeline folded in'''
+        self.intercept = float(intercept)
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.numeric_columns = list(numeric_columns)
+        self.numeric_fill = np.asarray(numeric_fill, dtype=np.float64)
+        self.numeric_index = np.asarray(numeric_index, dtype=np.int64)
+        self.categorical_columns = list(categorical_columns)
+        self.categorical_fill = [str(fill) for fill in categorical_fill]
+        self.categories = [np.asarray(values, dtype=str) for values in categories]
+        self.category_index = [np.asarray(index, dtype=np.int64) for index in category_index]
+
+        #Gathered once, so scoring is one matrix product and one lookup over every categorical cell
+        self.numeric_coef = self.coef[self.numeric_index]
+        self.categorical_fill_values = np.asarray(self.categorical_fill, dtype=object)
+
+        #Every category is keyed by its column position, one sorted table serves all categorical columns
+        self.category_prefix = np.asarray([f"{i}\x1f" for i in range(len(self.categorical_columns))], dtype=str)
+        keys = [np.char.add(prefix, values) for prefix, values in zip(self.category_prefix, self.categories)]
+        keys = np.concatenate(keys) if keys else np.empty(0, dtype=str)
+        key_coef = np.concatenate([self.coef[index] for index in self.category_index]) if keys.size else np.empty(0)
+        order = np.argsort(keys)
+        self.category_keys = keys[order]
+        self.category_key_coef = key_coef[order]
+
+    def predict(self, X) -> np.ndarray:
+        '''Scores a batch, X is a DataFrame or any mapping of column name to values'''
+        n_rows = len(X[(self.numeric_columns + self.categorical_columns)[0]])
+        predictions = np.full(n_rows, self.intercept)
+        if self.numeric_columns:
+            numeric = np.column_stack([np.asarray(X[col], dtype=np.float64) for col in self.numeric_columns])
+            numeric = np.where(np.isnan(numeric), self.numeric_fill, numeric)
+            predictions += numeric @ self.numeric_coef
+
+        if self.categorical_columns and self.category_keys.size:
+            values = np.column_stack([np.asarray(X[col], dtype=object) for col in self.categorical_columns])
+            values = np.where(values != values, self.categorical_fill_values, values).astype(str)
+            keys = np.char.add(self.category_prefix, values)
+            position = np.minimum(np.searchsorted(self.category_keys, keys), len(self.category_keys) - 1)
+
+            #Unknown categories are ignored like the one-hot encoder does, they select no coefficient
+            known = self.category_keys[position] == keys
+            predictions += np.where(known, self.category_key_coef[position], 0.0).sum(axis=1)
+        return predictions
+
+    def save(self, path: str):
+        '''Saves the arrays of the compiled model to a .npz file'''
+        arrays = {
+            "intercept": np.array(self.intercept),
+            "coef": self.coef,
+            "numeric_columns": np.asarray(self.numeric_columns, dtype=str),
+            "numeric_fill": self.numeric_fill,
+            "numeric_index": self.numeric_index,
+            "categorical_columns": np.asarray(self.categorical_columns, dtype=str),
+            "categorical_fill": np.asarray(self.categorical_fill, dtype=str),
+        }
+        for i, (categories, index) in enumerate(zip(self.categories, self.category_index)):
+            arrays[f"categories_{i}"] = categories
+            arrays[f"category_index_{i}"] = index
+        np.savez(path, **arrays)
+        logging.info(f"Compiled model saved to {path}")
+
+    @classmethod
+    def load(cls, path: str) -> "CompiledLinearModel":
+        '''Loads a compiled model saved with save'''
+        with np.load(path, allow_pickle=False) as arrays:
+            n_categorical = len(arrays["categorical_columns"])
+            return cls(
+                intercept=arrays["intercept"],
+                coef=arrays["coef"],
+                numeric_columns=arrays["numeric_columns"].tolist(),
+                numeric_fill=arrays["numeric_fill"],
+                numeric_index=arrays["numeric_index"],
+                categorical_columns=arrays["categorical_columns"].tolist(),
+                categorical_fill=arrays["categorical_fill"].tolist(),
+                categories=[arrays[f"categories_{i}"] for i in range(n_categorical)],
+                category_index=[arrays[f"category_index_{i}"] for i in range(n_categorical)],
+            )
+
+def fold_linear_model(model) -> tuple:
+    '''Returns the coefficients and intercept of a fitted linear model, or of a pipeline of scalers and passthrough
+    transformers ending in one, in terms of its unscaled input'''
+    steps = [step for _, step in model.steps] if hasattr(model, "steps") else [model]
+    *transformers, regressor = steps
+    if not hasattr(regressor, "coef_") or np.ndim(regressor.coef_) != 1:
+        raise ValueError(f"Cannot compile {type(regressor).__name__}, only single-target linear models are supported")
+
+    coef = np.asarray(regressor.coef_, dtype=np.float64)
+    intercept = float(np.ravel(regressor.intercept_)[0])
+
+    #Every scaling is folded into the coefficients, from the model backwards: (x - mean) / scale @ coef
+    for transformer in reversed(transformers):
+        if hasattr(transformer, "scale_") and hasattr(transformer, "mean_"):
+            if transformer.scale_ is not None:
+                coef = coef / transformer.scale_
+            if transformer.mean_ is not None and getattr(transformer, "with_mean", True):
+                intercept -= float(transformer.mean_ @ coef)
+        elif not hasattr(transformer, "func"):
+            raise ValueError(f"Cannot compile the {type(transformer).__name__} step")
+    return coef, intercept
+
+def compile_pipeline(pipeline) -> CompiledLinearModel:
+    '''Compiles a fitted pipeline of the imputation and one-hot encoding preprocessor and a linear model'''
+    coef, intercept = fold_linear_model(pipeline.named_steps["model"])
+    preprocessor = pipeline.named_steps["preprocessor"]
+
+    numeric_columns, numeric_fill, numeric_index = [], [], []
+    categorical_columns, categorical_fill, categories, category_index = [], [], [], []
+    offset = 0
+    #Walks the transformers in the order of their output columns
+    for _, transformer, columns in preprocessor.transformers_:
+        if transformer == "drop" or len(columns) == 0:
+            continue
+        steps = [step for _, step in transformer.steps] if hasattr(transformer, "steps") else [transformer]
+        imputer = next((step for step in steps if hasattr(step, "statistics_")), None)
+        encoder = next((step for step in steps if hasattr(step, "categories_")), None)
+        fill = imputer.statistics_ if imputer is not None else [np.nan] * len(columns)
+
+        #The imputer drops columns that were empty during fit
+        kept = [(col, value) for col, value in zip(columns, fill) if imputer is None or not (value != value)]
+
+        if encoder is None:
+            for col, value in kept:
+                numeric_columns.append(col)
+                numeric_fill.append(value)
+                numeric_index.append(offset)
+                offset += 1
+            continue
+
+        if getattr(encoder, "drop_idx_", None) is not None or getattr(encoder, "infrequent_categories_", None):
+            raise ValueError("Cannot compile a one-hot encoder with dropped or infrequent categories")
+        for (col, value), col_categories in zip(kept, encoder.categories_):
+            col_categories = np.asarray(col_categories).astype(str)
+            order = np.argsort(col_categories)
+            categorical_columns.append(col)
+            categorical_fill.append(value)
+            categories.append(col_categories[order])
+            category_index.append(offset + order)
+            offset += len(col_categories)
+
+    if offset != len(coef):
+        raise ValueError(f"The preprocessor produces {offset} columns but the model has {len(coef)} coefficients")
+
+    logging.info(f"Compiled {len(numeric_columns)} numeric and {len(categorical_columns)} categorical columns")
+    return CompiledLinearModel(intercept, coef, numeric_columns, numeric_fill, numeric_index,
+                               categorical_columns, categorical_fill, categories, category_index)
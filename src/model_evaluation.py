@@ -26,6 +26,25 @@ class RegressionModelEvaluation(ModelEvaluationStrategy):
         r2 = r2_score(y_test, y_pred)
         logging.info(f"Regression model evaluation completed  with mse: {mse}, r2: {r2}")
         return {"mse": mse, "r2": r2}
+    
+    def evaluate_chunks(self, model: RegressorMixin, chunks) -> dict:
+        '''Evaluates the regression model on (X, y) chunks by accumulating error sums'''
+        logging.info("Evaluating regression model on chunks")
+        n, sse, y_sum, y_sq_sum, shift = 0, 0.0, 0.0, 0.0, None
+        for X_chunk, y_chunk in chunks:
+            y_true = np.asarray(y_chunk, dtype=float)
+            y_pred = model.predict(X_chunk)
+            # Shift the targets by the first value to keep the sum of squares numerically stable
+            if shift is None:
+                shift = y_true[0]
+            n += len(y_true)
+            sse += float(((y_true - y_pred) ** 2).sum())
+            y_sum += float((y_true - shift).sum())
+            y_sq_sum += float(((y_true - shift) ** 2).sum())
+        mse = sse / n
+        r2 = 1 - sse / (y_sq_sum - y_sum ** 2 / n)
+        logging.info(f"Regression model evaluation completed  with mse: {mse}, r2: {r2}")
+        return {"mse": mse, "r2": r2}
 
 class ModelEvaluator:
     def __init__(self, strategy: ModelEvaluationStrategy):
@@ -40,4 +59,10 @@ class ModelEvaluator:
         '''Executes the strategy to evaluate the model'''
         logging.info("Evaluating model on selected strategy")
         
-        return self.strategy.evaluate(model, X_test, y_test)
\ No newline at end of file
+        return self.strategy.evaluate(model, X_test, y_test)
+    
+    def execute_evaluation_on_chunks(self, model: RegressorMixin, chunks) -> dict:
+        '''Executes the strategy to evaluate the model on (X, y) chunks'''
+        logging.info("Evaluating model on chunks")
+        
+        return self.strategy.evaluate_chunks(model, chunks)
\ No newline at end of file
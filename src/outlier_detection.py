@@ -1,68 +1,407 @@
+import os
+import json
 import logging
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
 import seaborn as sns
 import matplotlib.pyplot as plt
+from sklearn.ensemble import IsolationForest
+from src.chunked_pipeline import merge_counts, quantile_from_counts
+from src.streaming_statistics import RunningMoments, ColumnSketches
 
 #Setup Logging configuration
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
+def numeric_columns(data: pd.DataFrame) -> list:
+    '''Returns the numeric columns of a DataFrame'''
+    return list(data.select_dtypes(include=["number"]).columns)
+
+#Per-column bounds applied over NumPy column views
+class OutlierBounds:
+    def __init__(self, columns: list, lower, upper):
+        '''A value is an outlier when it is below lower or above upper, missing values never are'''
+        self.columns = list(columns)
+        self.lower = np.asarray(lower, dtype=np.float64)
+        self.upper = np.asarray(upper, dtype=np.float64)
+    
+    @classmethod
+    def from_series(cls, lower: pd.Series, upper: pd.Series):
+        '''Builds the bounds from lower and upper Series indexed by column'''
+        return cls(lower.index, lower.to_numpy(), upper[lower.index].to_numpy())
+    
+    def present(self, data: pd.DataFrame) -> list:
+        '''Returns the positions of the bounded columns present in the data'''
+        return [j for j, col in enumerate(self.columns) if col in data.columns]
+    
+    def outlier_mask(self, data: pd.DataFrame) -> np.ndarray:
+        '''Returns a row mask of outliers in any bounded column, in one pass with two row-sized buffers'''
+        n_rows = len(data)
+        outliers = np.zeros(n_rows, dtype=bool)
+        buffer = np.empty(n_rows, dtype=bool)
+        for j in self.present(data):
+            values = data[self.columns[j]].to_numpy(dtype=np.float64)
+            np.less(values, self.lower[j], out=buffer)
+            np.logical_or(outliers, buffer, out=outliers)
+            np.greater(values, self.upper[j], out=buffer)
+            np.logical_or(outliers, buffer, out=outliers)
+        return outliers
+    
+    def outlier_frame(self, data: pd.DataFrame) -> pd.DataFrame:
+        '''Returns the per-column outlier flags of the bounded columns'''
+        flags = {}
+        for j in self.present(data):
+            values = data[self.columns[j]].to_numpy(dtype=np.float64)
+            flags[self.columns[j]] = (values < self.lower[j]) | (values > self.upper[j])
+        return pd.DataFrame(flags, index=data.index)
+    
+    def to_dict(self) -> dict:
+        '''Returns the bounds as a json serializable dict'''
+        return {
+            "columns": [str(col) for col in self.columns],
+            "lower": self.lower.tolist(),
+            "upper": self.upper.tolist(),
+        }
+    
+    @classmethod
+    def from_dict(cls, state: dict):
+        '''Restores the bounds from the dict returned by to_dict'''
+        return cls(state["columns"], state["lower"], state["upper"])
+    
+    def save(self, path: str):
+        '''Persists the bounds as json so streaming and inference batches reuse them'''
+        with open(path, "w") as state_file:
+            json.dump(self.to_dict(), state_file, indent=2)
+    
+    @classmethod
+    def load(cls, path: str):
+        '''Loads bounds persisted with save'''
+        with open(path) as state_file:
+            return cls.from_dict(json.load(state_file))
+
 # Abstract Base Class for Outlier Detection
 class OutlierDetection(ABC):
+    @abstractmethod
+    def fit(self, data: pd.DataFrame):
+        '''Fits the detection state on the data'''
+        pass
+    
+    @abstractmethod
+    def outlier_mask(self, data: pd.DataFrame) -> np.ndarray:
+        '''Returns the row mask of outliers under the fitted state'''
+        pass
+    
     @abstractmethod
     def detect_outliers(self, data: pd.DataFrame) -> pd.DataFrame:
-        '''Detects outliers in the data'''
+        '''Fits on the data and returns its outlier flags'''
         pass
 
+#Base class for methods flagging values outside per-column bounds
+class BoundsOutlierDetection(OutlierDetection):
+    @abstractmethod
+    def fit_bounds(self, data: pd.DataFrame) -> OutlierBounds:
+        '''Computes the per-column bounds of the numeric columns of the data'''
+        pass
+    
+    def fit(self, data: pd.DataFrame):
+        '''Computes and keeps the bounds of the data'''
+        self.fitted_bounds = self.fit_bounds(data)
+        return self
+    
+    def outlier_mask(self, data: pd.DataFrame) -> np.ndarray:
+        '''Returns the row mask of outliers in any bounded column'''
+        return self.fitted().outlier_mask(data)
+    
+    def fitted(self) -> OutlierBounds:
+        '''Returns the fitted bounds, freezing those accumulated with partial_fit if needed'''
+        if self.fitted_bounds is None:
+            self.fitted_bounds = OutlierBounds.from_series(*self.bounds())
+        return self.fitted_bounds
+    
+    def detect_outliers(self, data: pd.DataFrame) -> pd.DataFrame:
+        '''Fits the bounds on the data and returns the per-column outlier flags'''
+        outliers = self.fit(data).fitted_bounds.outlier_frame(data)
+        logging.info(f"Outliers detected: {int(outliers.any(axis=1).sum())} rows")
+        return outliers
+    
+    def detect_outliers_fitted(self, data: pd.DataFrame) -> pd.DataFrame:
+        '''Detects outliers using the bounds already fitted'''
+        return self.fitted().outlier_frame(data)
+
 #Concrete class for Outlier Detection using Z-Score
-class ZScoreOutlierDetection(OutlierDetection):
+class ZScoreOutlierDetection(BoundsOutlierDetection):
     def __init__(self, threshold=3):
         self.threshold = threshold
+        self.moments = RunningMoments()
+        self.fitted_bounds = None
     
-    def detect_outliers(self, data: pd.DataFrame) -> pd.DataFrame:
-        '''Detects outliers using Z-Score method'''
+    def fit_bounds(self, data: pd.DataFrame) -> OutlierBounds:
+        '''Bounds |x - mean| / std <= threshold, from the mean and sample standard deviation of every column'''
         logging.info("Detecting outliers using Z-Score method")
-        z_scores = np.abs((data - data.mean()) / data.std())
-        outliers = z_scores > self.threshold
-        logging.info(f"Outliers detected: {outliers.shape[0]}")
-        return outliers
+        columns = numeric_columns(data)
+        lower, upper = np.empty(len(columns)), np.empty(len(columns))
+        for j, col in enumerate(columns):
+            values = data[col].to_numpy(dtype=np.float64)
+            values = values[~np.isnan(values)]
+            mean = values.mean() if len(values) else np.nan
+            std = values.std(ddof=1) if len(values) > 1 else np.nan
+            lower[j], upper[j] = mean - self.threshold * std, mean + self.threshold * std
+        return OutlierBounds(columns, lower, upper)
+    
+    def partial_fit(self, data: pd.DataFrame):
+        '''Merges the Welford moments of a chunk'''
+        self.moments.update(data)
+        self.fitted_bounds = None
+        return self
+    
+    def bounds(self):
+        '''Returns the lower and upper bounds from the fitted mean and standard deviation'''
+        mean, std = self.moments.mean, self.moments.std()
+        return mean - self.threshold * std, mean + self.threshold * std
     
 #Concrete class for Outlier Detection using IQR
-class IQROutlierDetection(OutlierDetection):
-    def detect_outliers(self, data):
-        '''Detects outliers using IQR method'''
+class IQROutlierDetection(BoundsOutlierDetection):
+    def __init__(self, backend="exact", sketch_size=200, rank_error=None):
+        '''backend="sketch" computes quantiles from mergeable KLL sketches in bounded memory,
+        sized by sketch_size or by a target normalized rank_error'''
+        if backend not in ["exact", "sketch"]:
+            raise ValueError(f"Unsupported quantile backend: {backend}")
+        self.backend = backend
+        self.sketch_size = sketch_size
+        self.rank_error = rank_error
+        self.value_counts = {}
+        self.sketches = self.new_sketches()
+        self.fitted_bounds = None
+    
+    def new_sketches(self) -> ColumnSketches:
+        '''Returns empty column sketches with the configured size'''
+        return ColumnSketches(self.sketch_size, self.rank_error)
+    
+    def fit_bounds(self, data: pd.DataFrame) -> OutlierBounds:
+        '''Bounds Q1 - 1.5 IQR and Q3 + 1.5 IQR, both quartiles of a column from a single sort or sketch'''
         logging.info("Detecting outliers using IQR method")
-        Q1 = data.quantile(0.25)
-        Q3 = data.quantile(0.75)
+        if self.backend == "sketch":
+            self.sketches = self.new_sketches().update(data)
+            return OutlierBounds.from_series(*self.bounds())
+        columns = numeric_columns(data)
+        lower, upper = np.empty(len(columns)), np.empty(len(columns))
+        for j, col in enumerate(columns):
+            values = data[col].to_numpy(dtype=np.float64)
+            values = values[~np.isnan(values)]
+            Q1, Q3 = np.quantile(values, [0.25, 0.75]) if len(values) else (np.nan, np.nan)
+            IQR = Q3 - Q1
+            lower[j], upper[j] = Q1 - 1.5 * IQR, Q3 + 1.5 * IQR
+        return OutlierBounds(columns, lower, upper)
+    
+    def partial_fit(self, data: pd.DataFrame):
+        '''Merges the value counts, or the sketches, of every numeric column of a chunk'''
+        if self.backend == "sketch":
+            self.sketches.update(data)
+        else:
+            for col in numeric_columns(data):
+                self.value_counts[col] = merge_counts(self.value_counts.get(col), data[col].value_counts())
+        self.fitted_bounds = None
+        return self
+    
+    def merge(self, other: "IQROutlierDetection"):
+        '''Merges the state accumulated by another worker with partial_fit'''
+        self.sketches.merge(other.sketches)
+        for col, counts in other.value_counts.items():
+            self.value_counts[col] = merge_counts(self.value_counts.get(col), counts)
+        self.fitted_bounds = None
+        return self
+    
+    def quantiles(self, qs) -> pd.DataFrame:
+        '''Returns the requested quantiles of every column seen by partial_fit, indexed by quantile'''
+        if self.backend == "sketch":
+            return self.sketches.quantiles(qs)
+        qs = np.asarray(qs, dtype=float)
+        return pd.DataFrame({col: quantile_from_counts(counts, qs) for col, counts in self.value_counts.items()}, index=qs)
+    
+    def bounds(self):
+        '''Returns the lower and upper bounds from the fitted quartiles'''
+        quartiles = self.quantiles([0.25, 0.75])
+        Q1, Q3 = quartiles.iloc[0], quartiles.iloc[1]
         IQR = Q3 - Q1
-        lower_bound = Q1 - 1.5 * IQR
-        upper_bound = Q3 + 1.5 * IQR
-        outliers = (data < lower_bound) | (data > upper_bound)
-        logging.info(f"Outliers detected: {outliers.shape[0]}")
+        return Q1 - 1.5 * IQR, Q3 + 1.5 * IQR
+
+#Concrete class for multivariate Outlier Detection using an Isolation Forest
+class IsolationForestOutlierDetection(OutlierDetection):
+    def __init__(self, contamination=0.01, n_estimators=100, max_samples=256, max_fit_rows=100_000, batch_size=10_000, n_jobs=None, random_state=42):
+        '''Isolates implausible combinations of the numeric columns, every tree is grown on max_samples rows
+        of a uniform sample of at most max_fit_rows rows. The score threshold flagging the contamination share
+        of the fit rows is fixed at fit time, new batches are scored in batch_size rows across n_jobs threads.'''
+        self.contamination = contamination
+        self.n_estimators = n_estimators
+        self.max_samples = max_samples
+        self.max_fit_rows = max_fit_rows
+        self.batch_size = batch_size
+        self.n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+        self.random_state = random_state
+        self.rng = np.random.RandomState(random_state)
+        self.sample = None
+        self.sample_keys = None
+        self.model = None
+        self.columns = None
+        self.medians = None
+        self.threshold = None
+    
+    def sample_rows(self, data: pd.DataFrame):
+        '''Gives every row of a chunk a uniform random key and merges it into the sample'''
+        numeric = data[numeric_columns(data)]
+        self.merge_sample(numeric, self.rng.random_sample(len(numeric)))
+    
+    def merge_sample(self, sample: pd.DataFrame, keys: np.ndarray):
+        '''Keeps the rows with the smallest keys, a uniform sample that merges across chunks and workers'''
+        if self.sample is not None:
+            sample = pd.concat([self.sample, sample], ignore_index=True)
+            keys = np.concatenate([self.sample_keys, keys])
+        keep = np.argsort(keys, kind="stable")[:self.max_fit_rows]
+        self.sample = sample.iloc[keep].reset_index(drop=True)
+        self.sample_keys = keys[keep]
+        self.model = None
+    
+    def to_array(self, data: pd.DataFrame) -> np.ndarray:
+        '''Stacks the fitted columns as float32, missing values replaced by the fitted medians'''
+        X = np.column_stack([data[col].to_numpy(dtype=np.float32) for col in self.columns])
+        missing = np.isnan(X)
+        if missing.any():
+            X[missing] = np.broadcast_to(self.medians, X.shape)[missing]
+        return X
+    
+    def score(self, X: np.ndarray) -> np.ndarray:
+        '''Scores the rows in batches on a thread pool, lower scores are more anomalous'''
+        starts = range(0, len(X), self.batch_size)
+        if self.n_jobs is None or self.n_jobs <= 1 or len(starts) <= 1:
+            return np.concatenate([self.model.score_samples(X[start:start + self.batch_size]) for start in starts] or [np.empty(0)])
+        with ThreadPoolExecutor(max_workers=self.n_jobs) as executor:
+            return np.concatenate(list(executor.map(lambda start: self.model.score_samples(X[start:start + self.batch_size]), starts)))
+    
+    def fit_sample(self):
+        '''Grows the forest on the sampled rows and fixes the contamination threshold'''
+        self.columns = list(self.sample.columns)
+        self.medians = np.nan_to_num(self.sample.median().to_numpy(dtype=np.float32))
+        X = self.to_array(self.sample)
+        self.model = IsolationForest(
+            n_estimators=self.n_estimators,
+            max_samples=min(self.max_samples, len(X)),
+            random_state=self.random_state
+        ).fit(X)
+        self.threshold = np.quantile(self.score(X), self.contamination)
+        logging.info(f"Isolation forest fitted on {len(X)} rows, score threshold {self.threshold:.4f}")
+    
+    def fit(self, data: pd.DataFrame):
+        '''Fits the forest on a uniform sample of the data'''
+        logging.info("Detecting outliers using Isolation Forest method")
+        self.sample, self.sample_keys = None, None
+        self.sample_rows(data)
+        self.fit_sample()
+        return self
+    
+    def partial_fit(self, data: pd.DataFrame):
+        '''Adds a chunk to the uniform sample, the forest is grown when the first batch is scored'''
+        self.sample_rows(data)
+        return self
+    
+    def merge(self, other: "IsolationForestOutlierDetection"):
+        '''Merges the sample accumulated by another worker with partial_fit'''
+        if other.sample is not None:
+            self.merge_sample(other.sample, other.sample_keys)
+        return self
+    
+    def outlier_mask(self, data: pd.DataFrame) -> np.ndarray:
+        '''Returns the row mask of rows scoring below the threshold fixed at fit time'''
+        if self.model is None:
+            self.fit_sample()
+        return self.score(self.to_array(data)) < self.threshold
+    
+    def detect_outliers(self, data: pd.DataFrame) -> pd.DataFrame:
+        '''Fits the forest on the data and returns its row outlier flags'''
+        outliers = pd.DataFrame({"isolation_forest": self.fit(data).outlier_mask(data)}, index=data.index)
+        logging.info(f"Outliers detected: {int(outliers['isolation_forest'].sum())} rows")
         return outliers
         
 
 class OutlierDetector:
-    def __init__(self, method: OutlierDetection):
+    def __init__(self, method: OutlierDetection, sketch_size= 200, rank_error= None):
+        '''Methods without quantile state get their capping quantiles from column sketches owned by the detector'''
         self.method = method
+        self.cap_sketches = ColumnSketches(sketch_size, rank_error)
         
     def set_method(self, method: OutlierDetection):
         logging.info("Setting new outlier detection method")
         self.method = method
+        self.cap_sketches = ColumnSketches(self.cap_sketches.k)
     
     def detect_outliers(self, data: pd.DataFrame) -> pd.DataFrame:
         '''Detects outliers using the selected method'''
         return self.method.detect_outliers(data)
     
-    def handle_outliers(self, data: pd.DataFrame, method= "remove", **kwargs) -> pd.DataFrame:
-        outliers = self.detect_outliers(data)
+    def fit(self, data: pd.DataFrame):
+        '''Computes the bounds of the detection method once'''
+        self.method.fit(data)
+        return self
+    
+    def partial_fit(self, data: pd.DataFrame):
+        '''Fits the detection method on a chunk, and the capping sketches if the method keeps no quantiles'''
+        self.method.partial_fit(data)
+        if not hasattr(self.method, "quantiles"):
+            self.cap_sketches.update(data)
+        return self
+    
+    def outlier_mask(self, data: pd.DataFrame) -> np.ndarray:
+        '''Returns the row mask of outliers under the fitted state'''
+        return self.method.outlier_mask(data)
+    
+    def transform(self, data: pd.DataFrame) -> pd.DataFrame:
+        '''Removes the rows of a chunk or batch that fall outside the fitted bounds, without refitting'''
+        return data[~self.outlier_mask(data)]
+    
+    def cap_bounds(self, data: pd.DataFrame, quantiles= (0.01, 0.99)) -> tuple:
+        '''Returns the capping quantiles of the data, both from one sort or, with a sketch backend, one sketch per column'''
+        if getattr(self.method, "backend", "exact") == "sketch":
+            limits = self.method.new_sketches().update(data).quantiles(quantiles)
+        else:
+            limits = data.quantile(list(quantiles), numeric_only= True)
+        return limits.iloc[0], limits.iloc[1]
+    
+    def cap(self, data: pd.DataFrame, quantiles= (0.01, 0.99)) -> pd.DataFrame:
+        '''Caps a chunk or batch at the quantiles accumulated with partial_fit, so winsorizing works out of core'''
+        if hasattr(self.method, "quantiles"):
+            limits = self.method.quantiles(quantiles)
+        else:
+            limits = self.cap_sketches.quantiles(quantiles)
+        if limits.empty:
+            raise ValueError("OutlierDetector must be fitted with partial_fit before cap")
+        return data.clip(lower= limits.iloc[0], upper= limits.iloc[1], axis= 1)
+    
+    def save_bounds(self, path: str):
+        '''Persists the fitted bounds'''
+        if not isinstance(self.method, BoundsOutlierDetection):
+            raise ValueError(f"{type(self.method).__name__} has no per-column bounds to persist")
+        self.method.fitted().save(path)
+    
+    def load_bounds(self, path: str):
+        '''Loads persisted bounds so new batches are handled without refitting'''
+        self.method.fitted_bounds = OutlierBounds.load(path)
+        return self
+    
+    def handle_outliers(self, data: pd.DataFrame, method= "remove", outliers= None, **kwargs) -> pd.DataFrame:
+        '''Handles outliers, reusing the outliers flags or row mask when the caller already has them'''
         if method == "remove":
             logging.info("Removing outliers")
-            data_cleaned = data[(~outliers).all(axis=1)]
+            if outliers is None:
+                row_mask = self.fit(data).outlier_mask(data)
+            elif isinstance(outliers, pd.DataFrame):
+                row_mask = outliers.any(axis=1).to_numpy()
+            else:
+                row_mask = np.asarray(outliers, dtype=bool)
+            data_cleaned = data[~row_mask]
         elif method == "cap":
             logging.info("Capping outliers")
-            data_cleaned = data.clip(lower= data.quantile(0.01), upper= data.quantile(0.99), axis= 1)
+            lower, upper = self.cap_bounds(data, kwargs.get("quantiles", (0.01, 0.99)))
+            data_cleaned = data.clip(lower= lower, upper= upper, axis= 1)
         else:
             logging.info("No action taken on outliers")
             data_cleaned = data
@@ -0,0 +1,260 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Online statistics that are updated chunk by chunk and merged across chunks or worker processes
+
+def weighted_quantile(values: np.ndarray, weights: np.ndarray, q):
+    '''Computes the q-th quantile of weighted values, interpolating between ranks like pandas,
+    an array of q gives all the quantiles from a single sort'''
+    if len(values) == 0:
+        return np.nan
+    order = np.argsort(values, kind="stable")
+    values = np.asarray(values, dtype=float)[order]
+    cumulative = np.cumsum(np.asarray(weights)[order])
+    position = q * (cumulative[-1] - 1)
+    lower = values[np.searchsorted(cumulative, np.floor(position), side="right")]
+    upper = values[np.searchsorted(cumulative, np.ceil(position), side="right")]
+    return lower + (upper - lower) * (position - np.floor(position))
+
+#Welford mean and variance for every column of a frame
+class RunningMoments:
+    def __init__(self):
+        '''Initializes empty per-column count, mean and sum of squared deviations'''
+        self.n = None
+        self.mean = None
+        self.m2 = None
+    
+    def update(self, data: pd.DataFrame):
+        '''Adds the numeric columns of a chunk'''
+        numeric = data.select_dtypes(include=["number"])
+        chunk = RunningMoments()
+        chunk.n = numeric.count().astype(float)
+        chunk.mean = numeric.mean()
+        chunk.m2 = ((numeric - chunk.mean) ** 2).sum()
+        return self.merge(chunk)
+    
+    def merge(self, other: "RunningMoments"):
+        '''Merges the moments of another accumulator with Chan's parallel formula'''
+        if other.n is None:
+            return self
+        if self.n is None:
+            self.n, self.mean, self.m2 = other.n.copy(), other.mean.copy(), other.m2.copy()
+            return self
+        
+        n_a, n_b = self.n.reindex(self.n.index.union(other.n.index)).fillna(0), other.n.reindex(self.n.index.union(other.n.index)).fillna(0)
+        mean_a, mean_b = self.mean.reindex(n_a.index), other.mean.reindex(n_a.index)
+        m2_a, m2_b = self.m2.reindex(n_a.index).fillna(0), other.m2.reindex(n_a.index).fillna(0)
+        
+        total = n_a + n_b
+        delta = (mean_b - mean_a).fillna(0)
+        weight = (n_b / total).fillna(0)
+        self.mean = (mean_a + delta * weight).fillna(mean_b)
+        self.m2 = m2_a + m2_b + delta ** 2 * n_a * weight
+        self.n = total
+        return self
+    
+    def variance(self, ddof: int = 1) -> pd.Series:
+        '''Returns the per-column variance'''
+        return self.m2 / (self.n - ddof)
+    
+    def std(self, ddof: int = 1) -> pd.Series:
+        '''Returns the per-column standard deviation'''
+        return np.sqrt(self.variance(ddof))
+
+#Centred cross products of features and target, the sufficient statistics of least squares
+class RunningCrossProducts:
+    def __init__(self):
+        '''Initializes an empty count, feature and target means, and centred cross products'''
+        self.n = 0
+        self.mean_x = None
+        self.mean_y = 0.0
+        self.cxx = None
+        self.cxy = None
+        self.cyy = 0.0
+    
+    def update(self, X: np.ndarray, y: np.ndarray):
+        '''Adds the rows of a chunk, memory stays O(features^2) whatever the number of rows'''
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        if len(y) == 0:
+            return self
+        chunk = RunningCrossProducts()
+        chunk.n = len(y)
+        chunk.mean_x = X.mean(axis=0)
+        chunk.mean_y = float(y.mean())
+        X_centred = X - chunk.mean_x
+        y_centred = y - chunk.mean_y
+        chunk.cxx = X_centred.T @ X_centred
+        chunk.cxy = X_centred.T @ y_centred
+        chunk.cyy = float(y_centred @ y_centred)
+        return self.merge(chunk)
+    
+    def merge(self, other: "RunningCrossProducts"):
+        '''Merges the cross products of another chunk or worker with Chan's parallel formula'''
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            self.n, self.mean_x, self.mean_y = other.n, other.mean_x.copy(), other.mean_y
+            self.cxx, self.cxy, self.cyy = other.cxx.copy(), other.cxy.copy(), other.cyy
+            return self
+        
+        total = self.n + other.n
+        delta_x = other.mean_x - self.mean_x
+        delta_y = other.mean_y - self.mean_y
+        weight = self.n * other.n / total
+        self.cxx += other.cxx + weight * np.outer(delta_x, delta_x)
+        self.cxy += other.cxy + weight * delta_x * delta_y
+        self.cyy += other.cyy + weight * delta_y * delta_y
+        self.mean_x += delta_x * other.n / total
+        self.mean_y += delta_y * other.n / total
+        self.n = total
+        return self
+    
+    def variance(self, ddof: int = 0) -> np.ndarray:
+        '''Returns the per-feature variance, population variance by default like StandardScaler'''
+        return self.cxx.diagonal() / (self.n - ddof)
+
+#KLL sketch for approximate quantiles in bounded memory
+class KLLSketch:
+    def __init__(self, k: int = 200, c: float = 2 / 3, random_state: int = 42):
+        '''Initializes the sketch, a larger k gives a smaller rank error (about 1.7 / k)'''
+        self.k = k
+        self.c = c
+        self.compactors = [np.empty(0)]
+        self.n = 0
+        self.rng = np.random.RandomState(random_state)
+    
+    def capacity(self, level: int) -> int:
+        '''Returns the capacity of a level, lower levels get geometrically smaller capacities'''
+        depth = len(self.compactors) - level - 1
+        return max(2, int(np.ceil(self.k * self.c ** depth)))
+    
+    def size(self) -> int:
+        '''Returns the number of items stored in the sketch'''
+        return sum(len(items) for items in self.compactors)
+    
+    def max_size(self) -> int:
+        '''Returns the number of items the sketch can store before compacting'''
+        return sum(self.capacity(level) for level in range(len(self.compactors)))
+    
+    def compress(self):
+        '''Compacts full levels, promoting every other sorted item with doubled weight'''
+        while self.size() > self.max_size():
+            for level, items in enumerate(self.compactors):
+                if len(items) < self.capacity(level):
+                    continue
+                if level + 1 == len(self.compactors):
+                    self.compactors.append(np.empty(0))
+                items = np.sort(items)
+                # An odd item stays behind so only pairs are compacted
+                keep = items[-1:] if len(items) % 2 else items[:0]
+                paired = items[:len(items) - len(keep)]
+                promoted = paired[self.rng.randint(2)::2]
+                self.compactors[level + 1] = np.concatenate([self.compactors[level + 1], promoted])
+                self.compactors[level] = keep
+                break
+    
+    def update(self, values):
+        '''Adds the non-missing values of an array'''
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        self.compactors[0] = np.concatenate([self.compactors[0], values])
+        self.n += len(values)
+        self.compress()
+        return self
+    
+    def merge(self, other: "KLLSketch"):
+        '''Merges another sketch level by level'''
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append(np.empty(0))
+        for level, items in enumerate(other.compactors):
+            self.compactors[level] = np.concatenate([self.compactors[level], items])
+        self.n += other.n
+        self.compress()
+        return self
+    
+    def quantile(self, q):
+        '''Returns the approximate q-th quantile (or an array of them), exact while no level has been compacted'''
+        values = np.concatenate(self.compactors)
+        weights = np.concatenate([np.full(len(items), 2 ** level) for level, items in enumerate(self.compactors)])
+        return weighted_quantile(values, weights, q)
+
+def sketch_size_for_error(rank_error: float) -> int:
+    '''Returns the KLL k that keeps the normalized rank error around rank_error'''
+    return int(np.ceil(1.7 / rank_error))
+
+#KLL sketches for every numeric column of a frame
+class ColumnSketches:
+    def __init__(self, k: int = 200, rank_error: float = None, random_state: int = 42):
+        '''Initializes one sketch per column on first sight, rank_error (e.g. 0.005) sizes the sketches instead of k'''
+        self.k = k if rank_error is None else sketch_size_for_error(rank_error)
+        self.random_state = random_state
+        self.sketches = {}
+    
+    def update(self, data: pd.DataFrame):
+        '''Adds the numeric columns of a chunk'''
+        for col in data.select_dtypes(include=["number"]).columns:
+            if col not in self.sketches:
+                self.sketches[col] = KLLSketch(self.k, random_state=self.random_state)
+            self.sketches[col].update(data[col].to_numpy(dtype=np.float64))
+        return self
+    
+    def merge(self, other: "ColumnSketches"):
+        '''Merges the sketches of another chunk or worker column by column'''
+        for col, sketch in other.sketches.items():
+            if col in self.sketches:
+                self.sketches[col].merge(sketch)
+            else:
+                self.sketches[col] = sketch
+        return self
+    
+    def quantiles(self, qs) -> pd.DataFrame:
+        '''Returns every requested quantile of every column, indexed by quantile like DataFrame.quantile'''
+        qs = np.asarray(qs, dtype=float)
+        return pd.DataFrame({col: sketch.quantile(qs) for col, sketch in self.sketches.items()}, index=qs)
+
+#SpaceSaving summary for the most frequent values in bounded memory
+class FrequentItems:
+    def __init__(self, max_counters: int = 1000):
+        '''Keeps at most max_counters counters, exact while there are no more distinct values than counters'''
+        self.max_counters = max_counters
+        self.counts = pd.Series(dtype=float)
+    
+    def update(self, values: pd.Series):
+        '''Adds the values of a chunk'''
+        return self.merge_counts(values.value_counts(), 0)
+    
+    def merge(self, other: "FrequentItems"):
+        '''Merges another summary'''
+        return self.merge_counts(other.counts, other.min_count())
+    
+    def min_count(self) -> float:
+        '''Returns the count an unmonitored value may have had, zero until all counters are in use'''
+        if len(self.counts) < self.max_counters:
+            return 0
+        return self.counts.min()
+    
+    def merge_counts(self, counts: pd.Series, counts_min: float):
+        '''Adds counts, crediting values missing from one side with that side's minimum, then keeps the largest counters'''
+        counts = counts.astype(float)
+        if len(self.counts) == 0:
+            merged = counts
+        elif len(counts) == 0:
+            merged = self.counts
+        else:
+            index = self.counts.index.union(counts.index)
+            merged = self.counts.reindex(index).fillna(self.min_count()) + counts.reindex(index).fillna(counts_min)
+        if len(merged) > self.max_counters:
+            merged = merged.nlargest(self.max_counters)
+        self.counts = merged
+        return self
+    
+    def most_frequent(self):
+        '''Returns the most frequent value, the smallest one on ties'''
+        if len(self.counts) == 0:
+            return np.nan
+        return self.counts.sort_index().idxmax()
@@ -0,0 +1,51 @@
+import logging
+from typing import Tuple
+
+from sklearn.pipeline import Pipeline
+from src.chunked_pipeline import ChunkedPipeline
+from src.data_splitter import DataSplitter, SimpleTrainingSplit
+from src.feature_engineering import LogTransform
+from src.handling_missing_values import FillMissingValuesStrategy
+from src.ingest_data import ZipStreamDataIngestion
+from src.model_building import ModelBuilder, SGDRegressionStrategy, StreamingLinearRegressionStrategy
+from src.model_evaluation import ModelEvaluator, RegressionModelEvaluation
+from src.outlier_detection import OutlierDetector, ZScoreOutlierDetection
+from zenml import step
+
+@step(enable_cache=False)
+def chunked_training_step(
+    file_path: str, target_column: str = "SalePrice", chunksize: int = 100_000, missing_values_strategy: str = "mean",
+    model_strategy: str = "linear", alpha: float = 0.0
+) -> Tuple[Pipeline, dict]:
+    """Runs ingestion through training chunk by chunk so peak memory is bounded by the chunk size.
+
+    model_strategy="linear" solves the (ridge, with alpha > 0) normal equations from one pass of accumulated
+    cross products, "sgd" trains an SGDRegressor over several passes.
+    """
+    if model_strategy == "linear":
+        model_builder = ModelBuilder(StreamingLinearRegressionStrategy(alpha= alpha))
+    elif model_strategy == "sgd":
+        model_builder = ModelBuilder(SGDRegressionStrategy())
+    else:
+        raise ValueError(f"Unsupported model strategy: {model_strategy}")
+    
+    data_ingestor = ZipStreamDataIngestion(chunksize=chunksize)
+    
+    #Same stages as ml_pipeline, each fitted on a streaming pass
+    chunked_pipeline = ChunkedPipeline(
+        chunk_source= lambda: data_ingestor.ingest_chunks(file_path),
+        stages= [
+            FillMissingValuesStrategy(missing_values_strategy),
+            LogTransform(["Gr Liv Area", target_column]),
+            OutlierDetector(ZScoreOutlierDetection(threshold= 3)),
+        ],
+        target= target_column,
+        splitter= DataSplitter(SimpleTrainingSplit()),
+    )
+    chunked_pipeline.fit()
+    
+    model = chunked_pipeline.train(model_builder)
+    evaluation_metrics = chunked_pipeline.evaluate(model, ModelEvaluator(RegressionModelEvaluation()))
+    logging.info(f"Chunked pipeline evaluation: {evaluation_metrics}")
+    
+    return model, evaluation_metrics
\ No newline at end of file
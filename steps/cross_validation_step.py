@@ -0,0 +1,24 @@
+import logging
+import pandas as pd
+from zenml import step
+from src.cross_validation import CrossValidationRunner
+from src.data_splitter import DataSplitter, KFoldSplit
+from src.model_building import ModelBuilder, LinearRegressionStrategy, build_preprocessor
+
+@step(enable_cache=False)
+def cross_validation_step(X_train: pd.DataFrame, y_train: pd.Series, n_splits: int = 5, n_jobs: int = None) -> dict:
+    """K-fold cross-validates the linear regression model on the training data
+
+    The preprocessed matrix is shared with the fold workers through a memory-mapped file.
+    """
+    if not isinstance(X_train, pd.DataFrame):
+        raise ValueError("X_train must be a pandas DataFrame")
+    if not isinstance(y_train, pd.Series):
+        raise ValueError("y_train must be a pandas Series")
+    
+    X_processed = build_preprocessor(X_train).fit_transform(X_train)
+    
+    runner = CrossValidationRunner(DataSplitter(KFoldSplit(n_splits= n_splits)), ModelBuilder(LinearRegressionStrategy()), n_jobs= n_jobs)
+    fold_metrics, summary = runner.run(X_processed, y_train)
+    logging.info(f"Fold metrics:\n{fold_metrics}")
+    return summary
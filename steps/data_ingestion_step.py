@@ -1,13 +1,28 @@
+import os
 import pandas as pd
 from src.ingest_data import DataIngestorFactory
 from zenml import step
 
 @step
-def data_ingestion_step(file_path: str):
+def data_ingestion_step(file_path: str, stream: bool = False, member: str = None, cache: bool = False, optimize_dtypes: bool = False, schema_path: str = "extracted_data/schema.json", partitioned: bool = False):
     '''Ingest data from a zip file'''
     #Determine file extension
-    file_extension = ".zip"
-    data_ingestor = DataIngestorFactory.get_data_ingestor(file_extension)
+    file_extension = os.path.splitext(file_path)[1] or ".zip"
+    
+    #Read every zip/csv shard of a directory or glob in parallel
+    if partitioned:
+        data_ingestor = DataIngestorFactory.get_data_ingestor(file_extension, partitioned=True)
+    #Compact dtypes are inferred once, persisted at schema_path and reapplied on later loads
+    elif optimize_dtypes:
+        data_ingestor = DataIngestorFactory.get_data_ingestor(file_extension, cache=cache, optimize_dtypes=True, member=member, schema_path=schema_path)
+    #Reuse the parquet copy of a previously parsed archive
+    elif cache:
+        data_ingestor = DataIngestorFactory.get_data_ingestor(file_extension, cache=True, member=member)
+    #Stream the csv member out of the archive instead of extracting it to disk
+    elif stream:
+        data_ingestor = DataIngestorFactory.get_data_ingestor(file_extension, stream=True, member=member)
+    else:
+        data_ingestor = DataIngestorFactory.get_data_ingestor(file_extension)
     
     #Ingest data and load it into a pandas DataFrame
     data= data_ingestor.ingest(file_path)
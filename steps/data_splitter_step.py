@@ -1,12 +1,20 @@
 from typing import Tuple
 import pandas as pd
 from zenml import step
-from src.data_splitter import DataSplitter, SimpleTrainingSplit
+from src.data_splitter import DataSplitter, SimpleTrainingSplit, TimeOrderedSplit
 
 @step
-def data_splitter_step(df: pd.DataFrame, target_column: str) -> Tuple[pd.DataFrame, pd.DataFrame, pd.Series, pd.Series]:
-    """Split the data into training and testing sets."""
-    splitter = DataSplitter(SimpleTrainingSplit())
+def data_splitter_step(df: pd.DataFrame, target_column: str, strategy: str = "simple", test_size: float = 0.2, random_state: int = 42) -> Tuple[pd.DataFrame, pd.DataFrame, pd.Series, pd.Series]:
+    """Split the data into training and testing sets.
+
+    strategy="time" holds out the most recent sales by Yr Sold and Mo Sold instead of a random sample.
+    """
+    if strategy == "simple":
+        splitter = DataSplitter(SimpleTrainingSplit(test_size= test_size, random_state= random_state))
+    elif strategy == "time":
+        splitter = DataSplitter(TimeOrderedSplit(test_size= test_size))
+    else:
+        raise ValueError(f"Unsupported split strategy: {strategy}")
     X_train, X_test, y_train, y_test = splitter.execute_split(df, target_column)
     return X_train, X_test, y_train, y_test
 
@@ -1,23 +1,48 @@
 import pandas as pd
-from src.feature_engineering import FeatureEngineer, MinMaxScalerTransform, StandardScalerTransform, OneHotEncoderTransform, LogTransform
+from src.feature_engineering import FeatureEngineer, FeatureEngineeringCache, MinMaxScalerTransform, StandardScalerTransform, OneHotEncoderTransform, LogTransform, HashingEncoderTransform, TargetEncoderTransform
 from zenml import step
 
-@step
-def feature_engineering_step(data: pd.DataFrame, strategy: str = "log", features: list = None)-> pd.DataFrame:
-    if features is None:
-        features = []
-    '''Applies feature engineering to the data'''
-    
+def get_strategy(strategy: str, features: list, sparse: bool = False, n_features: int = 2**10):
+    '''Returns the feature engineering strategy for a strategy name'''
     if strategy == "log":
-        feature_engineer = FeatureEngineer(LogTransform(features))
+        return LogTransform(features)
     elif strategy == "minmax":
-        feature_engineer = FeatureEngineer(MinMaxScalerTransform(features))
+        return MinMaxScalerTransform(features)
     elif strategy == "standard":
-        feature_engineer = FeatureEngineer(StandardScalerTransform(features))
+        return StandardScalerTransform(features)
     elif strategy == "onehot":
-        feature_engineer = FeatureEngineer(OneHotEncoderTransform(features))
+        return OneHotEncoderTransform(features, sparse= sparse)
+    elif strategy == "hashing":
+        return HashingEncoderTransform(features, n_features= n_features)
+    elif strategy == "target":
+        return TargetEncoderTransform(features)
     else:
         raise ValueError(f"Unknown strategy: {strategy}")
+
+@step
+def feature_engineering_step(data: pd.DataFrame, strategy: str = "log", features: list = None, chain: list = None, chain_path: str = None, sparse: bool = False, n_features: int = 2**10, cache_dir: str = None, n_jobs: int = None)-> pd.DataFrame:
+    '''Applies feature engineering to the data
+
+    chain is an ordered list of {"strategy": ..., "features": [...]} applied in one pass,
+    the fitted chain is persisted at chain_path so inference applies the same transforms.
+    sparse keeps one-hot encoded columns sparse all the way to the model,
+    n_features sets the fixed width of the "hashing" strategy,
+    the "target" strategy replaces categoricals with out-of-fold smoothed SalePrice means,
+    cache_dir memoizes the transformed frame on disk across runs with the same input and strategy,
+    n_jobs splits the features of column-wise strategies (log, minmax, standard) across threads on large frames.
+    '''
+    if features is None:
+        features = []
+    
+    cache = FeatureEngineeringCache(cache_dir) if cache_dir is not None else None
+    
+    if chain is not None:
+        feature_engineer = FeatureEngineer([get_strategy(link["strategy"], link.get("features", []), link.get("sparse", sparse), link.get("n_features", n_features)) for link in chain], cache= cache, n_jobs= n_jobs)
+    else:
+        feature_engineer = FeatureEngineer(get_strategy(strategy, features, sparse, n_features), cache= cache, n_jobs= n_jobs)
     
     transformed_data = feature_engineer.applying_feature_engineering(data)
+    
+    if chain_path is not None:
+        feature_engineer.save(chain_path)
     return transformed_data
\ No newline at end of file
@@ -1,21 +1,35 @@
+import os
 import pandas as pd
-from src.handling_missing_values import MissingValueHandler, DropMissingValuesStrategy, FillMissingValuesStrategy
+from src.handling_missing_values import MissingValueHandler, DropMissingValuesStrategy, FillMissingValuesStrategy, KNNFillMissingValuesStrategy
 
 from zenml import step
 
 @step
-def handle_missing_values_step(df: pd.DataFrame, strategy: str= 'meean') -> pd.DataFrame:
-    """Handles missing values in the data."""
+def handle_missing_values_step(df: pd.DataFrame, strategy: str= 'mean', categorical_method: str = None, fill_values_path: str = None, n_neighbors: int = 5, batch_size: int = 1024, n_jobs: int = None, reuse_fill_values: bool = False) -> pd.DataFrame:
+    """Handles missing values in the data.
+
+    reuse_fill_values fills with the values persisted at fill_values_path instead of refitting, e.g. for new rows.
+    """
+    
+    if reuse_fill_values and fill_values_path is not None and os.path.exists(fill_values_path):
+        return FillMissingValuesStrategy.load(fill_values_path).transform(df)
     
     if strategy == "drop":
         handler = MissingValueHandler(DropMissingValuesStrategy(axis = 0))
     
     elif strategy in ["mean", "median", "mode", "constant"]:
-        handler = MissingValueHandler(FillMissingValuesStrategy(strategy))
+        handler = MissingValueHandler(FillMissingValuesStrategy(strategy, categorical_method= categorical_method))
+    
+    elif strategy == "knn":
+        handler = MissingValueHandler(KNNFillMissingValuesStrategy(n_neighbors= n_neighbors, batch_size= batch_size, n_jobs= n_jobs))
     else:
         raise ValueError(f"Invalid strategy: {strategy}")
     
     cleaned_df = handler.handling_missing_values(df)
     
+    #Persist the fitted fill values so inference batches are filled with the training statistics
+    if fill_values_path is not None and isinstance(handler.strategy, FillMissingValuesStrategy):
+        handler.strategy.save(fill_values_path)
+    
     return cleaned_df
-    
\ No newline at end of file
+    
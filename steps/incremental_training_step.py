@@ -0,0 +1,49 @@
+import logging
+import pandas as pd
+
+import mlflow
+from typing import Annotated
+from sklearn.pipeline import Pipeline
+from src.model_building import ModelBuilder, SGDRegressionStrategy, StreamingLinearRegressionStrategy
+from zenml import ArtifactConfig, step
+from zenml.client import Client
+
+#Active experiment tracker
+experiment_tracker = Client().active_experiment_tracker
+
+@step(enable_cache= False, experiment_tracker= experiment_tracker.name)
+def incremental_training_step(
+    production_model: Pipeline, X_new: pd.DataFrame, y_new: pd.Series, model_strategy: str = "streaming"
+) -> Annotated[Pipeline, ArtifactConfig(name= "sklearn_pipeline", is_model_artifact= True)]:
+    """Updates the production model pipeline with new rows only
+
+    The fitted imputers and encoders of the pipeline are reused as they are. "streaming" merges the cross products
+    of the new rows into those carried by the model, "sgd" continues training with partial_fit.
+    """
+    if not isinstance(X_new, pd.DataFrame):
+        raise ValueError("X_new must be a pandas DataFrame")
+    if not isinstance(y_new, pd.Series):
+        raise ValueError("y_new must be a pandas Series")
+    
+    if model_strategy == "streaming":
+        model_builder= ModelBuilder(StreamingLinearRegressionStrategy())
+    elif model_strategy == "sgd":
+        model_builder= ModelBuilder(SGDRegressionStrategy())
+    else:
+        raise ValueError(f"Unsupported model strategy: {model_strategy}")
+    
+    updated_model= model_builder.execute_incremental_update(production_model, X_new, y_new)
+    logging.info(f"Production model updated with {len(X_new)} new rows")
+    
+    #Log the updated model so the deployer step finds it in the current run
+    if not mlflow.active_run():
+        mlflow.start_run()
+    
+    try:
+        mlflow.log_metric("n_new_rows", len(X_new))
+        mlflow.sklearn.log_model(updated_model, "model")
+    
+    finally:
+        mlflow.end_run()
+    
+    return updated_model
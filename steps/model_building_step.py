@@ -5,11 +5,9 @@ import mlflow
 from typing import Annotated
 from zenml import step, Output
 from sklearn.base import RegressorMixin
-from sklearn.compose import ColumnTransformer
-from sklearn.impute import SimpleImputer
 from sklearn.linear_model import LinearRegression
 from sklearn.pipeline import Pipeline
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from src.model_building import HistGradientBoostingStrategy, RegularizedSearchStrategy, StackingEnsembleStrategy, StreamingLinearRegressionStrategy, build_preprocessor, split_column_types
 from zenml import ArtifactConfig, step
 from zenml.client import Client
 
@@ -26,40 +24,31 @@ model = Model(
 
 @step(enable_cache= True, experiment_tracker= experiment_tracker.name, model= model)
 def model_building_step(
-    X_train: pd.DataFrame, y_train: pd.Series
+    X_train: pd.DataFrame, y_train: pd.Series, model_strategy: str = "linear", n_jobs: int = None
 ) -> Annotated[Pipeline, ArtifactConfig(name= "sklearn_pipeline", is_model_artifact= True)]:
     # Ensure the inputs are correct
     if not isinstance(X_train, pd.DataFrame):
         raise ValueError("X_train must be a pandas DataFrame")
     if not isinstance(y_train, pd.Series):
         raise ValueError("y_train must be a pandas Series")
+    if model_strategy not in ["linear", "streaming", "search", "hist_gbm", "stacking"]:
+        raise ValueError(f"Unsupported model strategy: {model_strategy}")
     
-    #identify numeric and categorical columns
-    categorical_col= X_train.select_dtypes(include= ["object", "category"]).columns
-    numerical_col= X_train.select_dtypes(exclude= ["object", "category"]).columns
+    #identify numeric, categorical and sparse (already one-hot encoded) columns
+    numerical_col, categorical_col, sparse_col= split_column_types(X_train)
     
     logging.info(f"Numerical columns: {numerical_col}")
     logging.info(f"Categorical columns: {categorical_col}")
+    logging.info(f"Sparse columns: {len(sparse_col)}")
     
-    # Define the preprocessing steps for numerical and categorical columns
-    numerical_transformer= SimpleImputer(strategy= "mean")
-    categorical_transformers= Pipeline(
-        steps=[
-            ("imputer", SimpleImputer(strategy= "most_frequent")),
-            ("encoder", OneHotEncoder(handle_unknown= "ignore")),
-        ]
-    )
+    # Imputation for numerical columns, imputation and one-hot encoding for categorical columns, sparse columns as CSR
+    preprocessor= build_preprocessor(X_train)
     
-    #Bundle preprocessing for numerical and categorical columns
-    preprocessor= ColumnTransformer(
-        transformers=[
-            ("num", numerical_transformer, numerical_col),
-            ("cat", categorical_transformers, categorical_col),
-        ]
-    )
-    
-    #Define the model traning pipeline
-    pipeline= Pipeline(steps=[("preprocessor", preprocessor), ("model", LinearRegression())])
+    #Define the model traning pipeline, gradient boosting splits on ordinal coded categoricals instead of one-hot columns
+    if model_strategy == "hist_gbm":
+        pipeline= HistGradientBoostingStrategy().build_pipeline(X_train)
+    else:
+        pipeline= Pipeline(steps=[("preprocessor", preprocessor), ("model", LinearRegression())])
     
     #Start the MLflow run to log the model
     if not mlflow.active_run():
@@ -69,17 +58,40 @@ def model_building_step(
         #Enable autologging for scikit-learn to automatically capture parameters, metrics, and model
         mlflow.sklearn.autolog()
         
-        logging.info("Building and training the Linear Regression model...")
-        # Fit the model
-        pipeline.fit(X_train, y_train)
+        #The search picks Ridge, Lasso or ElasticNet on the preprocessed matrix, the model step then scales and regresses
+        if model_strategy == "search":
+            logging.info("Searching regularized models...")
+            search_strategy= RegularizedSearchStrategy(n_jobs= n_jobs)
+            best_model, search_table= search_strategy.search(preprocessor.fit_transform(X_train), y_train)
+            pipeline.set_params(model= best_model)
+            mlflow.log_table(data= search_table, artifact_file= "search_table.json")
+        
+        # Fit the model, the streaming model keeps its sufficient statistics so it can later be updated with new rows only
+        # Autolog last sees the preprocessor fit, so the assembled pipeline is logged explicitly
+        if model_strategy == "streaming":
+            logging.info("Building and training the streaming Linear Regression model...")
+            pipeline.set_params(model= StreamingLinearRegressionStrategy().build_and_train_model_on_matrix(preprocessor.fit_transform(X_train), y_train))
+            mlflow.sklearn.log_model(pipeline, "model")
+        #The stacked ensemble fits its base learners on the raw frame, autolog sees no fit so the model is logged explicitly
+        elif model_strategy == "stacking":
+            logging.info("Building and training the stacking ensemble...")
+            stacking_strategy= StackingEnsembleStrategy(n_jobs= n_jobs)
+            pipeline= stacking_strategy.build_and_train_model(X_train, y_train)
+            mlflow.log_metrics(stacking_strategy.base_scores)
+            mlflow.sklearn.log_model(pipeline, "model")
+        else:
+            logging.info(f"Building and training the {type(pipeline.named_steps['model']).__name__} model...")
+            pipeline.fit(X_train, y_train)
         logging.info("Model training completed.")
         
         #Log the column that the model expects
-        onehot_encoder= (
-            pipeline.named_steps["preprocessor"].transformers_[1][1].named_steps["onehot"]
-        )
-        onehot_encoder.fit(X_train[categorical_col])
-        expected_columns= numerical_col.tolist() + list(onehot_encoder.get_feature_names_out(categorical_col))
+        if model_strategy in ["hist_gbm", "stacking"]:
+            expected_columns= numerical_col.tolist() + sparse_col.tolist() + categorical_col.tolist()
+        else:
+            onehot_encoder= (
+                pipeline.named_steps["preprocessor"].named_transformers_["cat"].named_steps["encoder"]
+            )
+            expected_columns= numerical_col.tolist() + list(onehot_encoder.get_feature_names_out(categorical_col)) + sparse_col.tolist()
         
         logging.info(f"Model expects the following columns: {expected_columns}")
     
@@ -0,0 +1,33 @@
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+from typing import Annotated
+from sklearn.pipeline import Pipeline
+from src.model_compilation import CompiledLinearModel, compile_pipeline
+from zenml import ArtifactConfig, step
+
+@step(enable_cache= False)
+def model_compilation_step(
+    trained_model: Pipeline, X_test: pd.DataFrame, output_path: str = "extracted_data/compiled_model.npz"
+) -> Annotated[CompiledLinearModel, ArtifactConfig(name= "compiled_model")]:
+    """Compiles the trained linear pipeline into imputation vectors, category lookup tables and coefficients
+
+    The compiled model scores with NumPy only, it is checked to predict the same as the pipeline on X_test.
+    """
+    if not isinstance(X_test, pd.DataFrame):
+        raise ValueError("X_test must be a pandas DataFrame")
+    
+    compiled_model= compile_pipeline(trained_model)
+    
+    compiled_predictions= compiled_model.predict(X_test)
+    pipeline_predictions= trained_model.predict(X_test)
+    difference= np.abs(compiled_predictions - pipeline_predictions).max()
+    logging.info(f"Largest difference to the pipeline predictions: {difference}")
+    if not np.allclose(compiled_predictions, pipeline_predictions, rtol= 1e-9, atol= 1e-9):
+        raise ValueError(f"The compiled model predictions differ from the pipeline by up to {difference}")
+    
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok= True)
+    compiled_model.save(output_path)
+    return compiled_model
@@ -1,13 +1,18 @@
 import logging
 
 import pandas as pd
-from src.outlier_detection import OutlierDetector, ZScoreOutlierDetection, IQROutlierDetection
+from src.outlier_detection import OutlierDetector, ZScoreOutlierDetection, IQROutlierDetection, IsolationForestOutlierDetection
 
 from zenml import step
 
 @step
-def outlier_detection_step(df: pd.DataFrame, column_name: str) -> pd.DataFrame:
-    """Detects outliers in the data using Z-Score method"""
+def outlier_detection_step(df: pd.DataFrame, column_name: str, bounds_path: str = None, strategy: str = "zscore", quantile_backend: str = "exact", rank_error: float = None, contamination: float = 0.01, n_jobs: int = None) -> pd.DataFrame:
+    """Detects outliers in the data using Z-Score (or IQR) method
+
+    The bounds are computed once, bounds_path persists them so later batches are filtered without refitting.
+    quantile_backend="sketch" computes the IQR quartiles from KLL sketches with the given rank_error.
+    strategy="isolation_forest" flags the contamination share of rows with implausible combinations of values.
+    """
     
     logging.info("Detecting outliers in the data")
     
@@ -20,11 +25,20 @@ def outlier_detection_step(df: pd.DataFrame, column_name: str) -> pd.DataFrame:
     if column_name not in df.columns:
         logging.error(f"Column {column_name} does not exist in the DataFrame")
         
-    df_numeric= df.select_dtypes(include= [int, float])
+    df_numeric= df.select_dtypes(include= "number")
     
-    outlier_detector= OutlierDetector(ZScoreOutlierDetection(threshold= 3))
+    if strategy == "zscore":
+        outlier_detector= OutlierDetector(ZScoreOutlierDetection(threshold= 3))
+    elif strategy == "iqr":
+        outlier_detector= OutlierDetector(IQROutlierDetection(backend= quantile_backend, rank_error= rank_error))
+    elif strategy == "isolation_forest":
+        outlier_detector= OutlierDetector(IsolationForestOutlierDetection(contamination= contamination, n_jobs= n_jobs))
+    else:
+        raise ValueError(f"Unsupported outlier detection strategy: {strategy}")
     
-    outliers= outlier_detector.detect_outliers(df_numeric)
     df_cleaned= outlier_detector.handle_outliers(df_numeric, method= "remove")
     
+    if bounds_path is not None and strategy != "isolation_forest":
+        outlier_detector.save_bounds(bounds_path)
+    
     return df_cleaned
\ No newline at end of file
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.feature_engineering import FeatureEngineer, FeatureEngineeringCache, OneHotEncoderTransform
+
+
+def housing_frame(index=None) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "Gr Liv Area": [1200.0, 1500.0, 900.0, 2100.0, 1750.0, 1300.0],
+            "Neighborhood": ["NAmes", "CollgCr", "OldTown", "NAmes", "Edwards", "CollgCr"],
+            "SalePrice": [150000.0, 210000.0, 95000.0, 320000.0, 230000.0, 170000.0],
+        },
+        index=index,
+    )
+
+
+def dense(data: pd.DataFrame) -> pd.DataFrame:
+    return data.apply(lambda column: column.sparse.to_dense() if isinstance(column.dtype, pd.SparseDtype) else column)
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_onehot_fit_save_load_transform(tmp_path, sparse):
+    data = housing_frame()
+    engineer = FeatureEngineer(OneHotEncoderTransform(features=["Neighborhood"], sparse=sparse))
+    trained = engineer.applying_feature_engineering(data)
+    
+    path = tmp_path / "chain.joblib"
+    engineer.save(str(path))
+    served = FeatureEngineer.load(str(path)).transform(data)
+    
+    pd.testing.assert_frame_equal(dense(served), dense(trained), check_dtype=False)
+
+
+def test_cache_hit_transform_matches_cache_miss(tmp_path):
+    data = housing_frame()
+    cache = FeatureEngineeringCache(cache_dir=str(tmp_path / "cache"))
+    
+    missed = FeatureEngineer(OneHotEncoderTransform(features=["Neighborhood"]), cache=cache)
+    missed.applying_feature_engineering(data)
+    hit = FeatureEngineer(OneHotEncoderTransform(features=["Neighborhood"]), cache=cache)
+    hit.applying_feature_engineering(data)
+    
+    assert cache.stats() == {"hits": 1, "misses": 1}
+    pd.testing.assert_frame_equal(hit.transform(data), missed.transform(data))
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_onehot_keeps_rows_aligned_on_non_range_index(sparse):
+    data = housing_frame(index=[10, 3, 7, 42, 5, 8])
+    transformed = OneHotEncoderTransform(features=["Neighborhood"], sparse=sparse).apply_transform(data)
+    
+    assert transformed.index.equals(data.index)
+    assert not dense(transformed).isna().any().any()
+    assert all(isinstance(transformed[col].dtype, pd.SparseDtype) == sparse for col in transformed.columns if col.startswith("Neighborhood_"))
+    np.testing.assert_array_equal(transformed["Neighborhood_NAmes"].to_numpy(dtype=float), [1.0, 0.0, 0.0, 1.0, 0.0, 0.0])
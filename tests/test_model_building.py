@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import Ridge
+
+from src.model_building import StreamingLinearRegressionStrategy
+
+
+def regression_frame(n_rows: int, seed: int) -> tuple:
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.normal(size=(n_rows, 3)), columns=["Gr Liv Area", "Overall Qual", "Year Built"])
+    y = pd.Series(X.to_numpy() @ np.array([3.0, -2.0, 0.5]) + rng.normal(scale=0.1, size=n_rows))
+    return X, y
+
+
+def test_streaming_update_keeps_the_ridge_penalty():
+    X_old, y_old = regression_frame(200, seed=0)
+    X_new, y_new = regression_frame(50, seed=1)
+    production = StreamingLinearRegressionStrategy(alpha=10.0).build_and_train_model(X_old, y_old)
+    
+    # The incremental step builds the strategy without arguments
+    updated = StreamingLinearRegressionStrategy().update_model(production, X_new, y_new)
+    refit = StreamingLinearRegressionStrategy(alpha=10.0).build_and_train_model(pd.concat([X_old, X_new]), pd.concat([y_old, y_new]))
+    
+    model = updated.named_steps["model"]
+    assert isinstance(model, Ridge)
+    assert model.alpha == 10.0
+    np.testing.assert_allclose(model.coef_, refit.named_steps["model"].coef_)
+    np.testing.assert_allclose(updated.predict(X_new), refit.predict(X_new))
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+from sklearn.pipeline import Pipeline
+
+from src.model_building import build_preprocessor
+from src.model_compilation import CompiledLinearModel, compile_pipeline
+
+
+def housing_frame() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "Gr Liv Area": [1200.0, 1500.0, np.nan, 2100.0, 1750.0, 1300.0, 1600.0, 980.0],
+            "Overall Qual": [5, 7, 4, 9, 8, 6, 7, 5],
+            "Neighborhood": ["NAmes", "CollgCr", "OldTown", "NAmes", "Edwards", np.nan, "CollgCr", "OldTown"],
+            "Bldg Type": ["1Fam", "1Fam", "Duplex", "1Fam", "TwnhsE", "1Fam", "Duplex", "1Fam"],
+        }
+    )
+
+
+def test_compiled_model_matches_the_pipeline(tmp_path):
+    X = housing_frame()
+    y = pd.Series([150000.0, 210000.0, 95000.0, 320000.0, 230000.0, 170000.0, 205000.0, 99000.0])
+    pipeline = Pipeline([("preprocessor", build_preprocessor(X)), ("model", LinearRegression())]).fit(X, y)
+    
+    path = tmp_path / "compiled_model.npz"
+    compile_pipeline(pipeline).save(str(path))
+    compiled = CompiledLinearModel.load(str(path))
+    
+    # Unknown categories select no coefficient, missing ones are filled like the imputer does
+    X_new = X.assign(Neighborhood=["NAmes", "Gilbert", np.nan, "Edwards", "OldTown", "CollgCr", "Blmngtn", "NAmes"])
+    np.testing.assert_allclose(compiled.predict(X_new), pipeline.predict(X_new), rtol=1e-9)
+    np.testing.assert_allclose(compiled.predict(X_new.iloc[[3]]), pipeline.predict(X_new.iloc[[3]]), rtol=1e-9)